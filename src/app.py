@@ -1,23 +1,29 @@
 import os
-from flask import Flask, render_template, session
+from flask import Flask, jsonify, make_response, render_template, session
 from werkzeug.middleware.proxy_fix import ProxyFix
 import uvicorn
 
-from asgiref.wsgi import WsgiToAsgi
 from flask_wtf import CSRFProtect
 
 # Custom modules
+from asgi import NativeRoutes, PooledWsgiToAsgi
 from auth.mfa import mfa_bp
 from auth.routes import auth_bp
 from content import content_bp
+from content.services import feed_cache_stats, search_cache_stats
+from content.uploads import MAX_REQUEST_BYTES, UploadRequest
 from user import user_bp
-from db import close_db
-from session_helpers import login_required, already_logged_in
+from db import close_db, pool_stats, wal_stats, writer_stats
+from session_helpers import admin_required, login_required, already_logged_in
+from templating import FragmentCacheExtension
 
 # Create app
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1) # trust nginx proxy
 app.secret_key = os.environ.get("SECRET_KEY")
+app.jinja_env.add_extension(FragmentCacheExtension)  # {% cache %} fragments
+app.request_class = UploadRequest  # uploads stream to disk, never to memory
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
 app.register_blueprint(mfa_bp)  # Routes at /mfa/*
 app.register_blueprint(auth_bp)  # Routes at /register, /login, /logout, etc.
 app.register_blueprint(
@@ -45,6 +51,14 @@ def not_found_error(e):
     return render_template("404.html"), 404
 
 
+@app.errorhandler(429)
+def too_many_requests(e):
+    response = make_response(render_template("429.html", retry_after=e.retry_after), 429)
+    if e.retry_after:
+        response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
 @app.errorhandler(500)
 def internal_error(e):
     app.logger.exception("Internal server error")
@@ -71,7 +85,21 @@ def dashboard():
     ), 200
 
 
-asgi_app = WsgiToAsgi(app)
+@app.route("/admin/stats")
+@admin_required
+def admin_stats():
+    """Database and cache counters of the worker process answering this request."""
+    return jsonify(
+        pools=pool_stats(),
+        writer=writer_stats(),
+        wal=wal_stats(),
+        feed_cache=feed_cache_stats(),
+        search_cache=search_cache_stats(),
+    )
+
+
+# Attachment downloads are served natively, the rest by Flask on a thread pool
+asgi_app = NativeRoutes(app, PooledWsgiToAsgi(app))
 
 if __name__ == "__main__":
     uvicorn.run(asgi_app, host="0.0.0.0", port=8000)
@@ -0,0 +1,159 @@
+"""
+ASGI entry point around the Flask app.
+
+asgiref's WsgiToAsgi runs every WSGI request through a thread-sensitive
+sync_to_async, i.e. on one single thread per process: requests are served
+one after the other, whatever the database pools allow. PooledWsgiToAsgi
+runs them on a bounded pool of REQUEST_THREADS threads instead.
+
+Attachment downloads are served natively: the session cookie is read with
+Flask's own serializer, the permission check is awaited on the DB executor
+(db.run_in_db_executor) and the file is sent in chunks, each read awaited
+off the event loop. A slow client therefore holds no request thread while
+it downloads. Anything the native handler does not serve (unknown
+attachment, no permission, missing file, Range requests) falls through to
+the Flask view, which answers as before.
+"""
+
+import asyncio
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from itsdangerous import BadSignature
+from werkzeug.http import dump_options_header, parse_cookie
+from werkzeug.utils import get_content_type
+
+import db
+from content import services
+
+# Threads running Flask requests; the read pool is sized to match
+REQUEST_THREADS = int(os.environ.get("WSGI_THREADS") or db.POOL_SIZE)
+
+ATTACHMENT_PATH = re.compile(r"/content/attachment/(\d+)")
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_request_executor = ThreadPoolExecutor(
+    max_workers=REQUEST_THREADS, thread_name_prefix="request"
+)
+
+
+class _PooledInstance(WsgiToAsgiInstance):
+    # Same body as asgiref's, minus thread_sensitive (one shared thread)
+    run_wsgi_app = SyncToAsync(
+        WsgiToAsgiInstance.run_wsgi_app.__wrapped__,
+        thread_sensitive=False,
+        executor=_request_executor,
+    )
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi serving concurrent requests on REQUEST_THREADS threads."""
+
+    async def __call__(self, scope, receive, send):
+        await _PooledInstance(self.wsgi_application, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+def _content_disposition(name):
+    """Attachment header for name, as Flask's send_file(as_attachment=True) builds it."""
+    try:
+        name.encode("ascii")
+        options = {"filename": name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+        options = {"filename": simple, "filename*": f"UTF-8''{quote(name, safe='!#$&+^`|~')}"}
+    return dump_options_header("attachment", options)
+
+
+class NativeRoutes:
+    """ASGI app serving attachment downloads itself, everything else through fallback."""
+
+    def __init__(self, app, fallback):
+        self.app = app
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            match = ATTACHMENT_PATH.fullmatch(scope["path"])
+            if match and await self._download(scope, send, int(match.group(1))):
+                return
+        await self.fallback(scope, receive, send)
+
+    def _session(self, headers):
+        """The Flask session of the request, read-only; {} when absent or invalid."""
+        cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+        value = cookies.get(self.app.config["SESSION_COOKIE_NAME"])
+        serializer = self.app.session_interface.get_signing_serializer(self.app)
+        if not value or serializer is None:
+            return {}
+        max_age = int(self.app.permanent_session_lifetime.total_seconds())
+        try:
+            return serializer.loads(value, max_age=max_age)
+        except BadSignature:
+            return {}
+
+    def _lookup(self, attachment_id, session):
+        with self.app.app_context():
+            return services.get_attachment_file(
+                attachment_id,
+                requesting_user_id=session.get("user_id"),
+                requesting_is_admin=session.get("role") == "admin",
+            )
+
+    async def _download(self, scope, send, attachment_id):
+        """Send the attachment; False when the Flask view should answer instead."""
+        headers = dict(scope["headers"])
+        if b"range" in headers:
+            return False
+        meta = await db.run_in_db_executor(
+            self._lookup, attachment_id, self._session(headers)
+        )
+        if not meta:
+            return False
+        directory, stored_name, original_name, mime_type = meta
+        loop = asyncio.get_running_loop()
+        try:
+            f = await loop.run_in_executor(
+                None, open, os.path.join(directory, stored_name), "rb"
+            )
+        except OSError:
+            return False
+
+        try:
+            size = os.fstat(f.fileno()).st_size
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (
+                            b"content-type",
+                            get_content_type(mime_type, "utf-8").encode("latin-1"),
+                        ),
+                        (b"content-length", str(size).encode()),
+                        (
+                            b"content-disposition",
+                            _content_disposition(original_name).encode("latin-1"),
+                        ),
+                        (b"cache-control", b"no-cache"),
+                        (b"vary", b"Cookie"),
+                    ],
+                }
+            )
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return True
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, DOWNLOAD_CHUNK_SIZE)
+                more = len(chunk) == DOWNLOAD_CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    return True
+        finally:
+            f.close()
@@ -8,11 +8,15 @@ import secrets
 
 # custom imports
 import field_utils
-from db import get_db
+from ratelimit import SlidingWindow, TokenBucket, client_ip, rate_limit, session_value
 from .repository import UserRepository
 
 mfa_bp = Blueprint("mfa", __name__, url_prefix="/mfa")
 
+# Code guesses: 5 at once, then one every 30 seconds per pending login
+VERIFY_USER_LIMIT = TokenBucket(5, 150)
+VERIFY_IP_LIMIT = SlidingWindow(30, 5 * 60)
+
 
 @mfa_bp.before_request
 def _require_login_for_mfa():
@@ -95,13 +99,8 @@ def confirm():
 
     user_id = session["user_id"]
     if pyotp.TOTP(secret).verify(code, valid_window=1):
-        db = get_db()
         backup_codes = [secrets.token_hex(6) for _ in range(8)]
-        db.execute(
-            "UPDATE users SET mfa_enabled = 1, mfa_secret = ?, backup_codes = ? WHERE id = ?",
-            (secret, json.dumps(backup_codes), user_id),
-        )
-        db.commit()
+        UserRepository.enable_mfa(user_id, secret, json.dumps(backup_codes))
         return render_template(
             "activation.html", mfa_success=True, backup_codes=backup_codes
         )
@@ -143,6 +142,8 @@ Notes:
 
 
 @mfa_bp.route("/verify", methods=["GET", "POST"])
+@rate_limit("mfa-ip", VERIFY_IP_LIMIT, key=client_ip)
+@rate_limit("mfa-user", VERIFY_USER_LIMIT, key=session_value("pre_auth_user_id"))
 def verify():
     # Called when session is in pre-auth state (session['pre_auth_user_id'])
     if request.method == "GET":
@@ -152,11 +153,7 @@ def verify():
     user_id = session.get("pre_auth_user_id")
     if not user_id:
         return redirect(url_for("auth.login"))
-    db = get_db()
-    row = db.execute(
-        "SELECT email, mfa_secret, backup_codes, role, disabled FROM users WHERE id = ?",
-        (user_id,),
-    ).fetchone()
+    row = UserRepository.get_mfa_state(user_id)
     if not row:
         return redirect(url_for("auth.login"))
     email, secret, backup_json, role, disabled = row
@@ -174,20 +171,15 @@ def verify():
         backups = json.loads(backup_json)
         if code in backups:
             backups.remove(code)
-            db.execute(
-                "UPDATE users SET backup_codes = ? WHERE id = ?",
-                (json.dumps(backups), user_id),
-            )
-            db.commit()
+            # The code is consumed before the login goes through; the
+            # last-login stamp is queued on the group-commit writer
+            UserRepository.update_backup_codes(user_id, json.dumps(backups))
+            UserRepository.update_last_login(user_id)
             session.clear()
             session["user_id"] = user_id
-            user = db.execute(
-                "SELECT email, role, disabled FROM users WHERE id = ?", (user_id,)
-            ).fetchone()
-            session["email"] = user[0]
-            session["role"] = user[1]
-            session["disabled"] = bool(user[2])
-            UserRepository.update_last_login(user_id)
+            session["email"] = email
+            session["role"] = role
+            session["disabled"] = bool(disabled)
             return redirect(url_for("dashboard"))
 
     #MFA could not be verified
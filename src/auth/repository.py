@@ -4,13 +4,23 @@ Encapsulates all database queries related to users and tokens.
 """
 
 from datetime import datetime
-from db import get_db
+from db import (
+    get_db,
+    commit,
+    identity_mapped,
+    inserted_ids,
+    reads,
+    submit_write,
+    transaction,
+    writes,
+)
 
 
 class UserRepository:
     """Handles user-related database operations."""
 
     @staticmethod
+    @writes
     def create(email, password_hash):
         """
         Create a new user.
@@ -19,18 +29,38 @@ class UserRepository:
         """
         db = get_db()
         created_at = datetime.now()
-        db.execute(
+        cur = db.execute(
             """
             INSERT INTO users (email, password_hash, created_at, activated)
             VALUES (?, ?, ?, ?)
             """,
             (email, password_hash, created_at.isoformat(), 0),
         )
-        db.commit()
-        user = db.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
-        return user[0] if user else None
+        commit(db)
+        return cur.lastrowid
 
     @staticmethod
+    @writes
+    def create_many(users):
+        """
+        Bulk-create users from (email, password_hash) pairs in one transaction.
+        Raises sqlite3.IntegrityError if any email already exists.
+        Returns the new user ids in input order.
+        """
+        created_at = datetime.now().isoformat()
+        rows = [(email, password_hash, created_at, 0) for email, password_hash in users]
+        with transaction() as db:
+            db.executemany(
+                """
+                INSERT INTO users (email, password_hash, created_at, activated)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return inserted_ids(db, len(rows))
+
+    @staticmethod
+    @reads
     def get_by_email(email):
         """Get user by email. Returns row with credentials and flags."""
         db = get_db()
@@ -45,46 +75,82 @@ class UserRepository:
         ).fetchone()
 
     @staticmethod
+    @identity_mapped
+    @reads
     def get_by_id(user_id):
         """Get user by ID. Returns user row or None."""
         db = get_db()
         return db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
 
     @staticmethod
+    @writes
     def activate(user_id):
         """Mark user as activated."""
         db = get_db()
         db.execute("UPDATE users SET activated = 1 WHERE id = ?", (user_id,))
-        db.commit()
+        commit(db)
 
     @staticmethod
+    @writes
     def increment_failed_logins(user_id):
-        """Increment failed login counter."""
-        db = get_db()
-        db.execute(
+        """Increment failed login counter (waits for the group commit)."""
+        submit_write(
             "UPDATE users SET nb_failed_logins = nb_failed_logins + 1 WHERE id = ?",
             (user_id,),
-        )
-        db.commit()
+        ).result()
 
     @staticmethod
+    @writes
     def reset_failed_logins(user_id):
-        """Reset failed login counter."""
-        db = get_db()
-        db.execute("UPDATE users SET nb_failed_logins = 0 WHERE id = ?", (user_id,))
-        db.commit()
+        """Reset failed login counter (waits for the group commit)."""
+        submit_write(
+            "UPDATE users SET nb_failed_logins = 0 WHERE id = ?", (user_id,)
+        ).result()
 
     @staticmethod
+    @writes
     def update_last_login(user_id):
-        """Update last login timestamp."""
-        db = get_db()
-        db.execute(
+        """Update last login timestamp (fire-and-forget through the write queue)."""
+        submit_write(
             "UPDATE users SET last_login = ? WHERE id = ?",
             (datetime.now().isoformat(), user_id),
         )
-        db.commit()
 
     @staticmethod
+    @identity_mapped
+    @reads
+    def get_mfa_state(user_id):
+        """Get (email, mfa_secret, backup_codes, role, disabled) for MFA checks."""
+        db = get_db()
+        return db.execute(
+            "SELECT email, mfa_secret, backup_codes, role, disabled FROM users WHERE id = ?",
+            (user_id,),
+        ).fetchone()
+
+    @staticmethod
+    @writes
+    def enable_mfa(user_id, secret, backup_codes_json):
+        """Enable MFA with its TOTP secret and backup codes (JSON list)."""
+        db = get_db()
+        db.execute(
+            "UPDATE users SET mfa_enabled = 1, mfa_secret = ?, backup_codes = ? WHERE id = ?",
+            (secret, backup_codes_json, user_id),
+        )
+        commit(db)
+
+    @staticmethod
+    @writes
+    def update_backup_codes(user_id, backup_codes_json):
+        """Replace the remaining MFA backup codes (JSON list)."""
+        db = get_db()
+        db.execute(
+            "UPDATE users SET backup_codes = ? WHERE id = ?",
+            (backup_codes_json, user_id),
+        )
+        commit(db)
+
+    @staticmethod
+    @writes
     def update_password(user_id, password_hash):
         """Update user password."""
         db = get_db()
@@ -92,13 +158,14 @@ class UserRepository:
             "UPDATE users SET password_hash = ? WHERE id = ?",
             (password_hash, user_id),
         )
-        db.commit()
+        commit(db)
 
 
 class TokenRepository:
     """Handles token-related database operations."""
 
     @staticmethod
+    @writes
     def create(token, user_id, expires_at, token_type):
         """Create a new token."""
         db = get_db()
@@ -115,9 +182,10 @@ class TokenRepository:
                 token_type,
             ),
         )
-        db.commit()
+        commit(db)
 
     @staticmethod
+    @reads
     def get_by_token(token, token_type):
         """
         Get token by token string and type.
@@ -130,13 +198,15 @@ class TokenRepository:
         ).fetchone()
 
     @staticmethod
+    @writes
     def mark_used(token):
         """Mark token as used."""
         db = get_db()
         db.execute("UPDATE tokens SET used = 1 WHERE token = ?", (token,))
-        db.commit()
+        commit(db)
 
     @staticmethod
+    @writes
     def invalidate_all_of_type_for_user(user_id, token_type):
         """Mark all tokens of a given type for a user as used."""
         db = get_db()
@@ -144,4 +214,4 @@ class TokenRepository:
             "UPDATE tokens SET used = 1 WHERE user_id = ? AND type = ?",
             (user_id, token_type),
         )
-        db.commit()
+        commit(db)
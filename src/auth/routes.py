@@ -4,6 +4,7 @@ Uses services layer for business logic.
 """
 
 from flask import Blueprint, render_template, request, session, redirect, url_for
+from ratelimit import SlidingWindow, client_ip, form_value, rate_limit
 from session_helpers import login_required, already_logged_in
 
 from . import services
@@ -11,6 +12,13 @@ from . import services
 # Create the blueprint here to avoid circular imports
 auth_bp = Blueprint("auth", __name__, template_folder="templates")
 
+# Reset mails: per client address, and per targeted address against mail spam
+RESET_IP_LIMIT = SlidingWindow(5, 15 * 60)
+RESET_EMAIL_LIMIT = SlidingWindow(3, 60 * 60)
+# Login attempts are refused before the password hash is computed
+LOGIN_IP_LIMIT = SlidingWindow(20, 5 * 60)
+LOGIN_EMAIL_LIMIT = SlidingWindow(10, 15 * 60)
+
 
 @auth_bp.route("/register", methods=["GET", "POST"])
 @already_logged_in
@@ -39,6 +47,8 @@ def activate(token):
 
 
 @auth_bp.route("/forgotten_password", methods=["GET", "POST"])
+@rate_limit("reset-ip", RESET_IP_LIMIT, key=client_ip)
+@rate_limit("reset-email", RESET_EMAIL_LIMIT, key=form_value("email"))
 def forgotten_password():
     """
     Handle forgotten password requests.
@@ -87,6 +97,8 @@ def password_reset(token):
 
 @auth_bp.route("/login", methods=["GET", "POST"])
 @already_logged_in
+@rate_limit("login-ip", LOGIN_IP_LIMIT, key=client_ip)
+@rate_limit("login-email", LOGIN_EMAIL_LIMIT, key=form_value("email"))
 def login():
     if request.method == "GET":
         return render_template("login.html"), 200
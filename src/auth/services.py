@@ -6,6 +6,7 @@ Orchestrates validation, repository calls, and email sending.
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from db import transaction
 from . import validators, mail, tokens
 from .repository import UserRepository, TokenRepository
 
@@ -53,20 +54,19 @@ def register_user(email, password, confirm_password):
     if validation_errors:
         return RegistrationResult(ok=False, errors=validation_errors)
 
-    # Try to create user
+    # Create user and activation token in a single transaction
     password_hash = generate_password_hash(password)
+    activation_token = tokens.generate_activation_token()
+    expiry = tokens.get_activation_token_expiry()
     try:
-        user_id = UserRepository.create(email, password_hash)
+        with transaction():
+            user_id = UserRepository.create(email, password_hash)
+            TokenRepository.create(activation_token, user_id, expiry, "activation")
     except sqlite3.IntegrityError:
         return RegistrationResult(
             ok=False, errors=["An account with this email already exists."]
         )
 
-    # Generate activation token
-    activation_token = tokens.generate_activation_token()
-    expiry = tokens.get_activation_token_expiry()
-    TokenRepository.create(activation_token, user_id, expiry, "activation")
-
     # Send activation email
     mail_sent = mail.send_activation_email(email, activation_token)
 
@@ -95,8 +95,9 @@ def activate_user(token):
         return False
 
     # Activate user and mark token as used
-    UserRepository.activate(user_id)
-    TokenRepository.mark_used(token)
+    with transaction():
+        UserRepository.activate(user_id)
+        TokenRepository.mark_used(token)
 
     return True
 
@@ -175,8 +176,9 @@ def reset_password(token, password, confirm_password):
     # Update password
     try:
         password_hash = generate_password_hash(password)
-        UserRepository.update_password(user_id, password_hash)
-        TokenRepository.mark_used(token)
+        with transaction():
+            UserRepository.update_password(user_id, password_hash)
+            TokenRepository.mark_used(token)
         return (True, None)
     except Exception as e:
         return (False, [f"Error resetting password: {str(e)}"])
@@ -227,11 +229,10 @@ def login_user(email, password):
             error_msg="Your account has been disabled by an administrator.",
         )
 
-    # Reset failed login counter on successful login
-    UserRepository.reset_failed_logins(user_id)
-
-    # Update last login time only if MFA is not enabled
+    # Both go through the group-commit writer; only the counter reset is waited on.
     # If MFA is enabled, last_login will be updated after MFA verification
+    if nb_failed_logins:
+        UserRepository.reset_failed_logins(user_id)
     if not mfa_enabled:
         UserRepository.update_last_login(user_id)
 
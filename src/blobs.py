@@ -0,0 +1,107 @@
+"""
+Content-addressed attachment storage.
+
+Each distinct file content is stored once, at
+UPLOAD_ROOT/objects/<first two hex digits>/<sha256>, whatever its name and
+however many attachments carry it. The attachments rows holding a digest are
+its references: the file is written by the first upload of that content and
+removed once the last row pointing at it is deleted.
+
+No Flask imports: migrations.py uses this module outside the app.
+"""
+
+import hashlib
+import os
+
+UPLOAD_ROOT = "/data/uploads"
+OBJECTS_DIR = os.path.join(UPLOAD_ROOT, "objects")
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(digest):
+    """Where the content with this SHA-256 hex digest is stored."""
+    return os.path.join(OBJECTS_DIR, digest[:2], digest)
+
+
+def legacy_path(post_id, stored_name):
+    """Per-post location used before content addressing."""
+    return os.path.join(UPLOAD_ROOT, str(post_id), stored_name)
+
+
+def has_blob(digest):
+    return os.path.exists(blob_path(digest))
+
+
+def blob_target(digest):
+    """blob_path(digest), with its fan-out directory created."""
+    path = blob_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def remove_blob(digest):
+    try:
+        os.unlink(blob_path(digest))
+    except FileNotFoundError:
+        pass
+
+
+def hash_file(path):
+    """(sha256 hex digest, size in bytes) of a file, read in chunks."""
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def link_file(path, digest):
+    """Store the content of an existing file under digest (a hard link, not a copy)."""
+    if not has_blob(digest):
+        try:
+            os.link(path, blob_target(digest))
+        except FileExistsError:
+            pass
+
+
+def fold_legacy_files(conn):
+    """
+    Move per-post attachment files into the store and record their digests,
+    in a transaction of its own: never call it inside another one. The
+    digests are committed before any legacy file is unlinked, so an
+    interrupted run never leaves a row without a file, and a second run
+    folds whatever the first one did not reach. Rows whose file is missing
+    keep sha256 NULL and are served from their legacy path. Returns the
+    number of files folded.
+    """
+    rows = conn.execute(
+        "SELECT id, post_id, stored_name FROM attachments WHERE sha256 IS NULL"
+    ).fetchall()
+    folded = []
+    for attachment_id, post_id, stored_name in rows:
+        path = legacy_path(post_id, stored_name)
+        if not os.path.isfile(path):
+            continue
+        digest, _ = hash_file(path)
+        link_file(path, digest)
+        conn.execute(
+            "UPDATE attachments SET sha256 = ?, stored_name = ? WHERE id = ?",
+            (digest, digest, attachment_id),
+        )
+        folded.append(path)
+    conn.commit()
+
+    for path in set(folded):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    for directory in {os.path.dirname(path) for path in folded}:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # still holds files no attachment references
+    return len(folded)
@@ -0,0 +1,161 @@
+"""
+Small in-process caches for hot, rarely changing reads.
+Entries are bounded by count (least recently used evicted first) and by age,
+and carry no cross-process coherence: each worker keeps its own copy.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    With `weigh` (value -> approximate size) the total weight is kept under
+    `max_weight` as well as the entry count under `max_entries`.
+    """
+
+    def __init__(self, max_entries, ttl, max_weight=None, weigh=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self._data = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+            expires_at, value, weight = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._weight -= weight
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        weight = self.weigh(value) if self.weigh else 0
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._weight -= old[2]
+            self._data[key] = (time.monotonic() + self.ttl, value, weight)
+            self._weight += weight
+            while len(self._data) > self.max_entries or (
+                self.max_weight is not None and self._weight > self.max_weight
+            ):
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._weight -= evicted
+                self._evictions += 1
+
+    def get_or_load(self, key, load):
+        """Return the cached value for key, calling load() to fill a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = load()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "weight": self._weight,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+
+class VersionCounter:
+    """
+    Monotonic generation number for a cached data set. Cache keys include
+    the current version, so bump() invalidates every entry at once; the old
+    entries are never read again and age out of the LRU.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+FEED_CACHE_SIZE = int(os.environ.get("FEED_CACHE_SIZE") or 256)
+FEED_CACHE_TTL = float(os.environ.get("FEED_CACHE_TTL") or 30)
+
+# Public feed pages, keyed by (feed_version, page, cursor, per_page)
+feed_cache = LRUTTLCache(FEED_CACHE_SIZE, FEED_CACHE_TTL)
+feed_version = VersionCounter()
+
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE") or 512)
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL") or 60)
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES") or 16 * 1024 * 1024)
+
+
+def _rows_weight(rows):
+    """Rough memory footprint of a list of result rows: the text they hold."""
+    return sum(
+        len(value) if isinstance(value, str) else 8
+        for row in rows
+        for value in (row.values() if isinstance(row, dict) else row)
+    )
+
+
+# Search result pages, keyed by (search_version, normalized query, page, per_page)
+search_cache = LRUTTLCache(
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    max_weight=SEARCH_CACHE_MAX_BYTES,
+    weigh=_rows_weight,
+)
+search_version = VersionCounter()
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE") or 4096)
+FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL") or 600)
+FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES") or 8 * 1024 * 1024)
+
+# Rendered template fragments ({% cache %} blocks), keyed by what they show.
+# Keys carry their own versions (e.g. updated_at), so nothing is bumped.
+fragment_cache = LRUTTLCache(
+    FRAGMENT_CACHE_SIZE,
+    FRAGMENT_CACHE_TTL,
+    max_weight=FRAGMENT_CACHE_MAX_BYTES,
+    weigh=len,
+)
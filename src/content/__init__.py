@@ -3,7 +3,7 @@ Content module - encapsulates posts, comments, and content management.
 Exposes a blueprint to be registered with the Flask app.
 """
 
-from . import routes
+from . import commands, routes  # noqa: F401 (commands registers CLI commands)
 
 # Export the blueprint
 content_bp = routes.content_bp
@@ -0,0 +1,35 @@
+"""
+Cache keys for rendered post cards on list pages (feed, admin feed, my
+posts, search). Templates wrap each card in {% cache "<page>", post_card_key(post) %}.
+"""
+
+from flask import session
+
+
+def viewer_class(post):
+    """Who is looking at the card, as far as its markup can differ."""
+    if session.get("role") == "admin":
+        return "admin"
+    user_id = session.get("user_id")
+    if user_id is not None and user_id == post["author_id"]:
+        return "author"
+    return "anonymous"
+
+
+def post_card_key(post):
+    """
+    Everything a card shows: updated_at covers title, excerpt and
+    visibility; the aggregates and author fields change without touching
+    the post row, so they are part of the key too.
+    """
+    return (
+        post["id"],
+        post["updated_at"],
+        viewer_class(post),
+        post["comment_count"],
+        post["attachment_count"],
+        post["preview_attachment_id"],
+        post.get("author_email"),
+        post.get("author_disabled"),
+        post.get("author_disabled_by_admin"),
+    )
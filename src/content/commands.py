@@ -0,0 +1,33 @@
+"""
+Content maintenance commands, run through the Flask CLI:
+    flask --app app content rebuild-feed
+    flask --app app content fold-uploads
+"""
+
+import sqlite3
+
+import click
+
+import blobs
+from db import DATABASE
+
+from .repository import FeedRepository
+from .routes import content_bp
+
+
+@content_bp.cli.command("rebuild-feed")
+def rebuild_feed():
+    """Recompute feed_entries from posts and users to repair drift."""
+    count = FeedRepository.rebuild()
+    click.echo(f"Feed rebuilt: {count} entries.")
+
+
+@content_bp.cli.command("fold-uploads")
+def fold_uploads():
+    """Move per-post attachment files (e.g. seeded ones) into the blob store."""
+    conn = sqlite3.connect(DATABASE)
+    try:
+        count = blobs.fold_legacy_files(conn)
+    finally:
+        conn.close()
+    click.echo(f"Uploads folded: {count} files.")
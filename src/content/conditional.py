@@ -0,0 +1,83 @@
+"""
+Conditional GET for content pages.
+Validators come from the content_version row (bumped by triggers on every
+content write) and from who is looking, so a repeat visit is answered with
+304 Not Modified before any page query runs or any template is rendered.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+
+
+def _viewer():
+    """
+    Identity part of the validator: private posts never share an ETag, and
+    a page embedding one session's CSRF token never validates for the next
+    session of the same user (logout and login issue a new secret).
+    """
+    user_id = session.get("user_id")
+    if user_id is None:
+        return "anonymous"
+    # Logged-in pages embed a token: create the secret before it is hashed
+    generate_csrf()
+    secret = session.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+    return f"{user_id}:{session.get('role')}:{secret}"
+
+
+def _csrf_bucket():
+    """
+    Pages embed CSRF tokens that expire after WTF_CSRF_TIME_LIMIT. Rolling
+    the ETag every half limit keeps a revalidated page's tokens usable.
+    """
+    limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    if not limit:
+        return 0
+    return int(time.time() // max(int(limit) // 2, 1))
+
+
+class PageValidators:
+    """
+    ETag and Last-Modified for one rendered page.
+    The ETag covers the content version, the viewer and the page's own key
+    (route arguments). Last-Modified cannot name a viewer, so it is only
+    sent to, and only honoured for, anonymous visitors. It also only has
+    one-second resolution: while the current second may still see another
+    write, it is neither sent nor honoured and the ETag alone decides.
+    """
+
+    def __init__(self, content_version, *key):
+        version, changed_at = content_version
+        self.anonymous = session.get("user_id") is None
+        self.last_modified = datetime.fromisoformat(changed_at).replace(
+            tzinfo=timezone.utc
+        )
+        self.settled = self.last_modified < datetime.now(timezone.utc).replace(
+            microsecond=0
+        )
+        raw = "|".join(str(part) for part in (version, _viewer(), _csrf_bucket(), *key))
+        self.etag = hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def not_modified(self):
+        """True when the client's cached copy is still current."""
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        if self.anonymous and self.settled and request.if_modified_since:
+            return self.last_modified <= request.if_modified_since
+        return False
+
+    def apply(self, response):
+        """Attach the validators and revalidate-always caching headers."""
+        response = make_response(response)
+        response.set_etag(self.etag)
+        if self.anonymous and self.settled:
+            response.last_modified = self.last_modified
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Cookie")
+        return response
+
+    def not_modified_response(self):
+        return self.apply(make_response("", 304))
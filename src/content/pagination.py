@@ -0,0 +1,39 @@
+"""
+Opaque cursors for keyset pagination of post listings.
+A cursor encodes a direction and the (created_at, id) of the row to page
+from, so the next page is an index range read instead of an OFFSET scan.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+AFTER = "after"
+BEFORE = "before"
+
+
+def encode_cursor(direction, row):
+    """Cursor pointing past `row` in `direction` (AFTER = older, BEFORE = newer)."""
+    raw = f"{direction}|{row['created_at']}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from the query string.
+    Returns (direction, (created_at, id)), or None if missing or malformed.
+    """
+    if not cursor or len(cursor) > 200:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, created_at, post_id = (
+            base64.urlsafe_b64decode(padded).decode().split("|")
+        )
+        datetime.fromisoformat(created_at)
+        post_id = int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (AFTER, BEFORE):
+        return None
+    return direction, (created_at, post_id)
@@ -26,7 +26,14 @@ def can_view_post(user_id, post_id, is_admin=False):
         - Post data structure: post[1] is author_id, post[4] is is_public flag.
         - Admin permission check is not yet implemented.
     """
-    post = PostRepository.get_by_id(post_id)
+    return can_view_post_row(user_id, PostRepository.get_by_id(post_id), is_admin)
+
+
+def can_view_post_row(user_id, post, is_admin=False):
+    """
+    Same rules as can_view_post, applied to a post row the caller already
+    loaded (it must carry author_id, is_public and the author flags).
+    """
     if not post:
         return False
 
@@ -2,53 +2,119 @@
 Repository pattern for content data access.
 """
 
+import re
 from datetime import datetime
-from db import get_db
+from cache import feed_version, search_version
+from db import (
+    after_commit,
+    get_db,
+    commit,
+    identity_mapped,
+    inserted_ids,
+    reads,
+    submit_write,
+    transaction,
+    writes,
+)
+
+# Length of the stored body preview shown on list pages
+EXCERPT_LENGTH = 300
+
+# Attachments shown inline as image previews
+IMAGE_MIME_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp")
+
+
+def _excerpt(body):
+    """Body preview stored alongside the post (same cut as SQL substr)."""
+    return body[:EXCERPT_LENGTH]
+
+
+def _keyset(after=None, before=None, key="p.created_at, p.id"):
+    """
+    Keyset pagination on (created_at, id) for post listings, newest first.
+    Returns (condition, params, order); the condition is always safe to AND
+    into a WHERE clause. Paging backwards (`before`) walks the index in
+    ascending order, so callers flip the rows back with _newest_first.
+    """
+    if after is not None:
+        return f"({key}) < (?, ?)", tuple(after), "DESC"
+    if before is not None:
+        return f"({key}) > (?, ?)", tuple(before), "ASC"
+    return "1 = 1", (), "DESC"
+
+
+def _newest_first(rows, order):
+    return rows[::-1] if order == "ASC" else rows
+
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+def _fts_match(query):
+    """
+    Turn free text into an FTS5 query: every word becomes a quoted prefix
+    term and all of them must match. Quoting keeps FTS5 operators and
+    column filters in user input from being interpreted.
+    """
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
 
 
 class PostRepository:
     """Handles post-related database operations."""
 
     @staticmethod
-    def get_last_post_time(author_id):
-        """Get the created_at timestamp of the user's most recent post.
-        Returns datetime object or None if no posts exist."""
-        db = get_db()
-        result = db.execute(
-            "SELECT created_at FROM posts WHERE author_id = ? ORDER BY created_at DESC LIMIT 1",
-            (author_id,),
-        ).fetchone()
-        if result:
-            return datetime.fromisoformat(result[0])
-        return None
-
-    @staticmethod
+    @writes
     def create(author_id, title, body, is_public=True):
         """Create a new post. Returns post_id."""
-        db = get_db()
         created_at = datetime.now()
-        db.execute(
-            """
-            INSERT INTO posts (author_id, title, body, is_public, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                author_id,
-                title,
-                body,
-                is_public,
-                created_at.isoformat(),
-                created_at.isoformat(),
-            ),
-        )
-        db.commit()
-        post = db.execute(
-            "SELECT id FROM posts WHERE author_id = ? ORDER BY created_at DESC LIMIT 1",
-            (author_id,),
-        ).fetchone()
-        return post[0] if post else None
+        with transaction() as db:
+            cur = db.execute(
+                """
+                INSERT INTO posts (author_id, title, body, excerpt, is_public, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    author_id,
+                    title,
+                    body,
+                    _excerpt(body),
+                    is_public,
+                    created_at.isoformat(),
+                    created_at.isoformat(),
+                ),
+            )
+            FeedRepository.refresh_posts([cur.lastrowid])
+        return cur.lastrowid
+
+    @staticmethod
+    @writes
+    def create_many(posts):
+        """
+        Bulk-create posts from (author_id, title, body, is_public) tuples in
+        one transaction (seeding, imports). Returns the new post ids in order.
+        """
+        created_at = datetime.now().isoformat()
+        rows = [
+            (author_id, title, body, _excerpt(body), is_public, created_at, created_at)
+            for author_id, title, body, is_public in posts
+        ]
+        with transaction() as db:
+            db.executemany(
+                """
+                INSERT INTO posts (author_id, title, body, excerpt, is_public, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            post_ids = inserted_ids(db, len(rows))
+            FeedRepository.refresh_posts(post_ids)
+            return post_ids
 
     @staticmethod
+    @identity_mapped
+    @reads
     def get_by_id(post_id):
         """Get post by ID with author info."""
         db = get_db()
@@ -65,187 +131,385 @@ class PostRepository:
         ).fetchone()
 
     @staticmethod
-    def get_public_posts(limit=50, offset=0):
-        """Get all public posts (for feed)."""
+    @reads
+    def get_detail(post_id):
+        """
+        Post with author flags and its attachments in one statement: one row
+        per attachment (oldest first), or a single row with NULL attachment
+        columns when there are none. Returns [] if the post does not exist.
+        """
         db = get_db()
         return db.execute(
             """
             SELECT p.id, p.author_id, p.title, p.body, p.is_public, p.created_at,
-                   u.email AS author_email
+                   p.updated_at, p.comment_count, u.email AS author_email,
+                   u.disabled AS author_disabled,
+                   u.disabled_by_admin AS author_disabled_by_admin,
+                   a.id AS attachment_id, a.original_name, a.stored_name,
+                   a.mime_type, a.size_bytes, a.created_at AS attachment_created_at
             FROM posts p
             JOIN users u ON p.author_id = u.id
-            WHERE p.is_public = 1
-              AND u.disabled = 0
-              AND u.disabled_by_admin = 0
-            ORDER BY p.created_at DESC
+            LEFT JOIN attachments a ON a.post_id = p.id
+            WHERE p.id = ?
+            ORDER BY a.created_at ASC
+            """,
+            (post_id,),
+        ).fetchall()
+
+    @staticmethod
+    @reads
+    def get_public_posts(limit=50, offset=0, after=None, before=None):
+        """Get all public posts (for feed), read from the feed_entries model.
+
+        Pages by OFFSET, or by keyset when `after` / `before` is a
+        (created_at, id) position: rows strictly older / newer than it.
+        """
+        db = get_db()
+        condition, params, order = _keyset(after, before, key="f.created_at, f.post_id")
+        rows = db.execute(
+            f"""
+            SELECT f.post_id AS id, f.author_id, f.title, f.excerpt, 1 AS is_public,
+                   f.created_at, f.updated_at, f.author_email
+            FROM feed_entries f
+            WHERE {condition}
+            ORDER BY f.created_at {order}, f.post_id {order}
             LIMIT ? OFFSET ?
             """,
-            (limit, offset),
+            (*params, limit, offset),
         ).fetchall()
+        return _newest_first(rows, order)
 
     @staticmethod
-    def get_all_posts(limit=50, offset=0):
+    @reads
+    def get_all_posts(limit=50, offset=0, after=None, before=None):
         """Admin: get every post regardless of visibility or author status."""
         db = get_db()
-        return db.execute(
-            """
-            SELECT p.id, p.author_id, p.title, p.body, p.is_public, p.created_at,
-                   u.email AS author_email, u.disabled AS author_disabled,
+        condition, params, order = _keyset(after, before)
+        rows = db.execute(
+            f"""
+            SELECT p.id, p.author_id, p.title, p.excerpt, p.is_public, p.created_at,
+                   p.updated_at, u.email AS author_email, u.disabled AS author_disabled,
                    u.disabled_by_admin AS author_disabled_by_admin
             FROM posts p
             JOIN users u ON p.author_id = u.id
-            ORDER BY p.created_at DESC
+            WHERE {condition}
+            ORDER BY p.created_at {order}, p.id {order}
             LIMIT ? OFFSET ?
             """,
-            (limit, offset),
+            (*params, limit, offset),
         ).fetchall()
+        return _newest_first(rows, order)
 
     @staticmethod
-    def get_by_author(author_id, limit=50, offset=0):
+    @reads
+    def get_by_author(author_id, limit=50, offset=0, after=None, before=None):
         """Get all posts by a specific author (including private posts).
         
         Allows self-disabled users to see their own posts, but filters out
         posts from admin-disabled users.
         """
         db = get_db()
-        return db.execute(
-            """
-            SELECT p.id, p.author_id, p.title, p.body, p.is_public, p.created_at,
-                   u.email AS author_email
+        condition, params, order = _keyset(after, before)
+        rows = db.execute(
+            f"""
+            SELECT p.id, p.author_id, p.title, p.excerpt, p.is_public, p.created_at,
+                   p.updated_at
             FROM posts p
             JOIN users u ON p.author_id = u.id
                         WHERE p.author_id = ?
                             AND u.disabled_by_admin = 0
-            ORDER BY p.created_at DESC
+                            AND {condition}
+            ORDER BY p.created_at {order}, p.id {order}
             LIMIT ? OFFSET ?
             """,
-            (author_id, limit, offset),
+            (author_id, *params, limit, offset),
         ).fetchall()
+        return _newest_first(rows, order)
 
     @staticmethod
+    def with_card_stats(posts):
+        """
+        Decorate a page of post rows for list cards: each becomes a dict with
+        comment_count, attachment_count and preview_attachment_id (first
+        image, or None). One grouped query per relation, whatever the page size.
+        """
+        post_ids = [post["id"] for post in posts]
+        comments = dict(CommentRepository.count_by_posts(post_ids))
+        attachments = {
+            row["post_id"]: row for row in AttachmentRepository.summarize_by_posts(post_ids)
+        }
+        cards = []
+        for post in posts:
+            card = dict(post)
+            summary = attachments.get(post["id"])
+            card["comment_count"] = comments.get(post["id"], 0)
+            card["attachment_count"] = summary["attachment_count"] if summary else 0
+            card["preview_attachment_id"] = summary["preview_id"] if summary else None
+            cards.append(card)
+        return cards
+
+    @staticmethod
+    @writes
     def update(post_id, title, body, is_public=True):
         """Update an existing post."""
-        db = get_db()
-        db.execute(
-            """
-            UPDATE posts
-            SET title = ?, body = ?, is_public = ?, updated_at = ?
-            WHERE id = ?
-            """,
-            (title, body, is_public, datetime.now().isoformat(), post_id),
-        )
-        db.commit()
+        with transaction() as db:
+            db.execute(
+                """
+                UPDATE posts
+                SET title = ?, body = ?, excerpt = ?, is_public = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (title, body, _excerpt(body), is_public, datetime.now().isoformat(), post_id),
+            )
+            FeedRepository.refresh_posts([post_id])
 
     @staticmethod
+    @writes
     def delete(post_id):
-        """Delete a post (hard delete or soft delete based on design)."""
-        db = get_db()
-        db.execute("DELETE FROM posts WHERE id = ?", (post_id,))
-        db.commit()
+        """
+        Delete a post and its attachment rows. Returns the digests those
+        rows referenced, for the caller to reclaim unreferenced files.
+        """
+        with transaction() as db:
+            rows = db.execute(
+                "DELETE FROM attachments WHERE post_id = ? RETURNING sha256", (post_id,)
+            ).fetchall()
+            db.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+            FeedRepository.remove_post(post_id)
+        return {row[0] for row in rows if row[0]}
 
     @staticmethod
-    def search(query, limit=50):
-        """Search posts by title or content."""
+    @reads
+    def search(query, limit=20, offset=0):
+        """
+        Full-text search over post title, body and attachment names, best
+        matches first (bm25 through the posts_fts rank). Only public posts of
+        enabled authors are returned.
+        """
+        match = _fts_match(query)
+        if not match:
+            return []
         db = get_db()
-        search_term = f"%{query}%"
         return db.execute(
             """
-            SELECT p.id, p.author_id, p.title, p.body, p.is_public, p.created_at,
-                   u.email AS author_email
-            FROM posts p
+            SELECT p.id, p.author_id, p.title, p.excerpt, p.is_public, p.created_at,
+                   p.updated_at, u.email AS author_email
+            FROM posts_fts f
+            JOIN posts p ON p.id = f.rowid
             JOIN users u ON p.author_id = u.id
-                        WHERE p.is_public = 1
-                            AND u.disabled = 0
-                            AND u.disabled_by_admin = 0
-                            AND (p.title LIKE ? OR p.body LIKE ?)
-            ORDER BY p.created_at DESC
-            LIMIT ?
+            WHERE posts_fts MATCH ?
+              AND p.is_public = 1
+              AND u.disabled = 0
+              AND u.disabled_by_admin = 0
+            ORDER BY f.rank
+            LIMIT ? OFFSET ?
             """,
-            (search_term, search_term, limit),
+            (match, limit, offset),
         ).fetchall()
 
+
+# Visible feed rows for posts matching {where}
+_FEED_ENTRY_SELECT = """
+    INSERT INTO feed_entries (
+        post_id, author_id, author_email, title, excerpt, created_at, updated_at
+    )
+    SELECT p.id, p.author_id, u.email, p.title, p.excerpt, p.created_at, p.updated_at
+    FROM posts p
+    JOIN users u ON p.author_id = u.id
+    WHERE {where}
+      AND p.is_public = 1
+      AND u.disabled = 0
+      AND u.disabled_by_admin = 0
+"""
+
+
+
+def _feed_changed():
+    """
+    Something a post card shows changed (post, author, comment or attachment):
+    drop cached feed pages and search results.
+    """
+    feed_version.bump()
+    search_version.bump()
+
+
+def _feed_insert(where):
+    return _FEED_ENTRY_SELECT.format(where=where)
+
+
+class FeedRepository:
+    """
+    Maintains feed_entries, the denormalized read model behind the public
+    feed. Every write that changes what the feed shows (post create, edit,
+    delete; author disable, rename, deletion) refreshes the affected rows in
+    the same transaction. rebuild() recomputes the whole table from posts.
+    Each change bumps cache.feed_version and cache.search_version once
+    committed, which invalidates the cached feed pages and search results.
+    """
+
     @staticmethod
-    def search_by_attachment_filename(query, limit=50):
-        """Search for posts that have attachments matching the query filename."""
+    @writes
+    def refresh_posts(post_ids):
+        """Recompute the feed entries of the given posts."""
         db = get_db()
-        search_term = f"%{query}%"
-        return db.execute(
-            """
-            SELECT DISTINCT p.id, p.author_id, p.title, p.body, p.is_public, p.created_at,
-                u.email AS author_email
-            FROM posts p
-            JOIN users u ON p.author_id = u.id
-            JOIN attachments a ON p.id = a.post_id
-                        WHERE p.is_public = 1
-                            AND u.disabled = 0
-                            AND u.disabled_by_admin = 0
-                            AND (a.original_name LIKE ? OR a.stored_name LIKE ?)
-            ORDER BY p.created_at DESC
-            LIMIT ?
-            """,
-            (search_term, search_term, limit),
-        ).fetchall()
+        keys = [(post_id,) for post_id in post_ids]
+        db.executemany("DELETE FROM feed_entries WHERE post_id = ?", keys)
+        db.executemany(_feed_insert("p.id = ?"), keys)
+        commit(db)
+        after_commit(_feed_changed)
+
+    @staticmethod
+    @writes
+    def remove_post(post_id):
+        """Drop a deleted post from the feed."""
+        db = get_db()
+        db.execute("DELETE FROM feed_entries WHERE post_id = ?", (post_id,))
+        commit(db)
+        after_commit(_feed_changed)
+
+    @staticmethod
+    @writes
+    def refresh_author(author_id):
+        """Recompute every entry of one author (disabled, enabled, renamed)."""
+        db = get_db()
+        db.execute("DELETE FROM feed_entries WHERE author_id = ?", (author_id,))
+        db.execute(_feed_insert("p.author_id = ?"), (author_id,))
+        commit(db)
+        after_commit(_feed_changed)
+
+    @staticmethod
+    @writes
+    def remove_author(author_id):
+        """Drop every entry of a deleted author."""
+        db = get_db()
+        db.execute("DELETE FROM feed_entries WHERE author_id = ?", (author_id,))
+        commit(db)
+        after_commit(_feed_changed)
+
+    @staticmethod
+    @writes
+    def rebuild():
+        """Recompute the whole feed from posts and users. Returns the row count."""
+        with transaction() as db:
+            db.execute("DELETE FROM feed_entries")
+            db.execute(_feed_insert("1 = 1"))
+            count = db.execute("SELECT COUNT(*) FROM feed_entries").fetchone()[0]
+            after_commit(_feed_changed)
+        return count
 
 
 class CommentRepository:
     """Handles comment-related database operations."""
 
     @staticmethod
+    @writes
     def create(author_id, post_id, text):
-        """Create a new comment."""
-        db = get_db()
+        """Create a new comment through the group-commit writer. Returns comment_id."""
         created_at = datetime.now()
-        db.execute(
+        comment_id = submit_write(
             """
             INSERT INTO comments (author_id, post_id, text, created_at)
             VALUES (?, ?, ?, ?)
             """,
             (author_id, post_id, text, created_at.isoformat()),
-        )
-        db.commit()
-        comment = db.execute(
-            "SELECT id FROM comments WHERE author_id = ? AND post_id = ? ORDER BY created_at DESC LIMIT 1",
-            (author_id, post_id),
-        ).fetchone()
-        return comment[0] if comment else None
+        ).result()
+        after_commit(_feed_changed)
+        return comment_id
 
     @staticmethod
-    def get_by_post(post_id):
-        """Get all comments for a post."""
+    @writes
+    def create_many(comments):
+        """
+        Bulk-create comments from (author_id, post_id, text) tuples in one
+        transaction (seeding, imports). Returns the new comment ids in order.
+        """
+        created_at = datetime.now().isoformat()
+        rows = [
+            (author_id, post_id, text, created_at)
+            for author_id, post_id, text in comments
+        ]
+        with transaction() as db:
+            db.executemany(
+                """
+                INSERT INTO comments (author_id, post_id, text, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
+            )
+            after_commit(_feed_changed)
+            return inserted_ids(db, len(rows))
+
+    @staticmethod
+    @reads
+    def get_by_post(post_id, limit=20, after=None):
+        """Get one page of a post's visible comments, oldest first.
+
+        `after` is the (created_at, id) of the last comment already shown;
+        the page continues strictly after it.
+        """
         db = get_db()
+        condition, params = "1 = 1", ()
+        if after is not None:
+            condition, params = "(c.created_at, c.id) > (?, ?)", tuple(after)
         return db.execute(
-            """
+            f"""
             SELECT c.id, c.author_id, c.text, c.created_at, u.email AS author_email
             FROM comments c
             JOIN users u ON c.author_id = u.id
             WHERE c.post_id = ?
               AND u.disabled = 0
               AND u.disabled_by_admin = 0
-            ORDER BY c.created_at ASC
+              AND {condition}
+            ORDER BY c.created_at ASC, c.id ASC
+            LIMIT ?
             """,
-            (post_id,),
+            (post_id, *params, limit),
         ).fetchall()
 
     @staticmethod
+    @reads
+    def count_by_posts(post_ids):
+        """
+        Visible comment counts as (post_id, count) rows, read from the
+        comment_count that triggers maintain on posts.
+        """
+        if not post_ids:
+            return []
+        db = get_db()
+        return db.execute(
+            f"""
+            SELECT id AS post_id, comment_count
+            FROM posts
+            WHERE id IN ({_placeholders(post_ids)})
+            """,
+            tuple(post_ids),
+        ).fetchall()
+
+    @staticmethod
+    @writes
     def delete(comment_id):
         """Delete a comment."""
         db = get_db()
         db.execute("DELETE FROM comments WHERE id = ?", (comment_id,))
-        db.commit()
+        commit(db)
+        after_commit(_feed_changed)
 
 
 class AttachmentRepository:
     """Handles attachment-related database operations."""
 
     @staticmethod
-    def create(post_id, uploader_id, original_name, stored_name, mime_type, size_bytes):
+    @writes
+    def create(
+        post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, sha256=None
+    ):
         """Create a new attachment and return its id."""
         db = get_db()
         created_at = datetime.now()
-        db.execute(
+        cur = db.execute(
             """
-            INSERT INTO attachments (post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO attachments (post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, sha256, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 post_id,
@@ -254,23 +518,44 @@ class AttachmentRepository:
                 stored_name,
                 mime_type,
                 size_bytes,
+                sha256,
                 created_at.isoformat(),
             ),
         )
-        db.commit()
-        row = db.execute(
-            "SELECT id FROM attachments WHERE post_id = ? ORDER BY created_at DESC LIMIT 1",
-            (post_id,),
-        ).fetchone()
-        return row[0] if row else None
+        commit(db)
+        after_commit(_feed_changed)
+        return cur.lastrowid
 
     @staticmethod
+    @writes
+    def create_many(attachments):
+        """
+        Bulk-create attachments from
+        (post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, sha256)
+        tuples in one transaction. Returns the new attachment ids in order.
+        """
+        created_at = datetime.now().isoformat()
+        rows = [tuple(a) + (created_at,) for a in attachments]
+        with transaction() as db:
+            db.executemany(
+                """
+                INSERT INTO attachments (post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, sha256, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            after_commit(_feed_changed)
+            return inserted_ids(db, len(rows))
+
+    @staticmethod
+    @reads
     def get_by_post(post_id):
         """Get all attachments for a post."""
         db = get_db()
         return db.execute(
             """
-            SELECT id, post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, created_at
+            SELECT id, post_id, uploader_id, original_name, stored_name, mime_type, size_bytes,
+                   sha256, created_at
             FROM attachments
             WHERE post_id = ?
             ORDER BY created_at ASC
@@ -279,12 +564,40 @@ class AttachmentRepository:
         ).fetchall()
 
     @staticmethod
+    @reads
+    def summarize_by_posts(post_ids):
+        """
+        Per-post attachment count and the id of the first image (preview_id,
+        NULL when the post has no image). Posts without attachments are absent.
+        """
+        if not post_ids:
+            return []
+        db = get_db()
+        images = _placeholders(IMAGE_MIME_TYPES)
+        return db.execute(
+            f"""
+            SELECT a.post_id, COUNT(*) AS attachment_count,
+                   (SELECT i.id FROM attachments i
+                    WHERE i.post_id = a.post_id AND i.mime_type IN ({images})
+                    ORDER BY i.created_at ASC
+                    LIMIT 1) AS preview_id
+            FROM attachments a
+            WHERE a.post_id IN ({_placeholders(post_ids)})
+            GROUP BY a.post_id
+            """,
+            (*IMAGE_MIME_TYPES, *post_ids),
+        ).fetchall()
+
+    @staticmethod
+    @identity_mapped
+    @reads
     def get_by_id(attachment_id):
         """Get a single attachment by id."""
         db = get_db()
         return db.execute(
             """
-            SELECT id, post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, created_at
+            SELECT id, post_id, uploader_id, original_name, stored_name, mime_type, size_bytes,
+                   sha256, created_at
             FROM attachments
             WHERE id = ?
             """,
@@ -292,8 +605,46 @@ class AttachmentRepository:
         ).fetchone()
 
     @staticmethod
+    @writes
     def delete(attachment_id):
-        """Delete an attachment row."""
+        """
+        Delete an attachment row. Returns the digest it referenced (None for
+        legacy rows); the caller reclaims the file if it was the last one.
+        """
+        db = get_db()
+        row = db.execute(
+            "DELETE FROM attachments WHERE id = ? RETURNING sha256", (attachment_id,)
+        ).fetchone()
+        commit(db)
+        after_commit(_feed_changed)
+        return row[0] if row else None
+
+    @staticmethod
+    @reads
+    def referenced_digests(digests):
+        """The subset of digests some attachment still references."""
+        if not digests:
+            return set()
         db = get_db()
-        db.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
-        db.commit()
+        digests = list(digests)
+        rows = db.execute(
+            f"""
+            SELECT DISTINCT sha256 FROM attachments
+            WHERE sha256 IN ({_placeholders(digests)})
+            """,
+            digests,
+        ).fetchall()
+        return {row[0] for row in rows}
+
+
+class ContentVersionRepository:
+    """Reads the trigger-maintained content_version row (HTTP validators)."""
+
+    @staticmethod
+    @reads
+    def get():
+        """Returns (version, changed_at) of the last content write."""
+        db = get_db()
+        return db.execute(
+            "SELECT version, changed_at FROM content_version WHERE id = 1"
+        ).fetchone()
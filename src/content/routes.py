@@ -1,5 +1,9 @@
 """
 Content routes - posts, comments, search, feed.
+Feed and post pages answer conditional GETs (content.conditional) before
+loading anything.
+List pages are streamed (templating.stream_page): their rows are loaded
+while the already-sent layout is on its way to the client.
 """
 
 from flask import (
@@ -12,22 +16,53 @@ from flask import (
     send_from_directory,
     abort,
 )
+from ratelimit import (
+    SlidingWindow,
+    TokenBucket,
+    client_ip,
+    rate_limit,
+    refund,
+    session_value,
+)
 from session_helpers import login_required, admin_required
+from templating import Deferred, stream_page
 
 from . import services
+from .cards import post_card_key
+from .conditional import PageValidators
 
 content_bp = Blueprint(
     "content", __name__, url_prefix="/content", template_folder="templates"
 )
+content_bp.add_app_template_global(post_card_key)
+
+# Posting: one post every 3 minutes; rejected submissions are refunded
+POST_LIMIT = TokenBucket(1, 3 * 60)
+COMMENT_LIMIT = SlidingWindow(10, 60)
+# Search: bursts of 30, then 2 per second per client address
+SEARCH_LIMIT = TokenBucket(30, 15)
+
+
+def _posting_too_fast(retry_after):
+    return render_template(
+        "post_create.html",
+        errors=[f"You must wait {retry_after} seconds before posting again."],
+    ), 429
 
 
 @content_bp.route("/feed")
 def feed():
     """Display public feed."""
     page = request.args.get("page", 1, type=int)
-    posts = services.get_public_feed(page=page)
+    cursor = request.args.get("cursor")
+    validators = PageValidators(services.get_content_version(), "feed", page, cursor)
+    if validators.not_modified():
+        return validators.not_modified_response()
 
-    return render_template("feed.html", posts=posts, page=page)
+    feed_page = Deferred(
+        lambda: services.get_public_feed(page=page, cursor=cursor)
+    )
+    return validators.apply(stream_page("feed.html", feed=feed_page, page=page))
 
 
 @content_bp.route("/admin/feed")
@@ -35,8 +70,11 @@ def feed():
 def admin_feed():
     """Admin global feed (all posts)."""
     page = request.args.get("page", 1, type=int)
-    posts = services.get_admin_feed(page=page, per_page=20)
-    return render_template("admin_feed.html", posts=posts, page=page)
+    cursor = request.args.get("cursor")
+    feed_page = Deferred(
+        lambda: services.get_admin_feed(page=page, per_page=20, cursor=cursor)
+    )
+    return stream_page("admin_feed.html", feed=feed_page, page=page)
 
 
 @content_bp.route("/posts")
@@ -45,9 +83,16 @@ def user_posts():
     """Display current user's posts (both public and private)."""
     user_id = session.get("user_id")
     page = request.args.get("page", 1, type=int)
-    posts = services.get_user_posts(user_id, page=page)
+    cursor = request.args.get("cursor")
+    feed_page = services.get_user_posts(user_id, page=page, cursor=cursor)
 
-    return render_template("user_posts.html", posts=posts, page=page)
+    return render_template(
+        "user_posts.html",
+        posts=feed_page.posts,
+        page=page,
+        next_cursor=feed_page.next_cursor,
+        prev_cursor=feed_page.prev_cursor,
+    )
 
 
 @content_bp.route("/post/<int:post_id>")
@@ -55,22 +100,55 @@ def view_post(post_id):
     """View a single post."""
     user_id = session.get("user_id")
     is_admin = session.get("role") == "admin"
-    post = services.get_post_view(
-        post_id, requesting_user_id=user_id, requesting_is_admin=is_admin
+    validators = PageValidators(services.get_content_version(), "post", post_id)
+    if validators.not_modified():
+        return validators.not_modified_response()
+
+    view = services.load_post_view(
+        post_id,
+        requesting_user_id=user_id,
+        requesting_is_admin=is_admin,
     )
 
-    if not post:
+    if not view:
         return render_template("404.html"), 404
 
-    comments = services.get_by_post(post_id)
-    attachments = services.get_attachments_for_post(post_id)
+    return validators.apply(
+        render_template(
+            "post_detail.html",
+            post=view.post,
+            comments=view.comments.comments,
+            comments_next_cursor=view.comments.next_cursor,
+            image_attachments=view.images,
+            other_attachments=view.files,
+        )
+    )
+
+
+@content_bp.route("/post/<int:post_id>/comments")
+def post_comments(post_id):
+    """Next page of a post's comments, as an HTML fragment for the detail page."""
+    page = services.get_post_comments(
+        post_id,
+        request.args.get("cursor"),
+        requesting_user_id=session.get("user_id"),
+        requesting_is_admin=session.get("role") == "admin",
+    )
+    if page is None:
+        abort(404)
     return render_template(
-        "post_detail.html", post=post, comments=comments, attachments=attachments
+        "_comment_list.html",
+        post_id=post_id,
+        comments=page.comments,
+        comments_next_cursor=page.next_cursor,
     )
 
 
 @content_bp.route("/post/create", methods=["GET", "POST"])
 @login_required
+@rate_limit(
+    "post", POST_LIMIT, key=session_value("user_id"), on_limit=_posting_too_fast
+)
 def create_post():
     """
     Handle GET and POST requests for creating a new post.
@@ -103,6 +181,8 @@ def create_post():
     result = services.create_post(user_id, title, body, is_public, files=files)
 
     if not result.ok:
+        # Nothing was posted: the attempt does not count against POST_LIMIT
+        refund("post")
         return render_template("post_create.html", errors=result.errors)
 
     return redirect(url_for("content.view_post", post_id=result.post_id))
@@ -161,6 +241,7 @@ def delete_post(post_id):
 
 @content_bp.route("/post/<int:post_id>/comment", methods=["POST"])
 @login_required
+@rate_limit("comment", COMMENT_LIMIT, key=session_value("user_id"))
 def add_comment(post_id):
     """Add a comment to a post."""
     user_id = session.get("user_id")
@@ -178,15 +259,17 @@ def add_comment(post_id):
 
 
 @content_bp.route("/search")
+@rate_limit("search", SEARCH_LIMIT, key=client_ip, methods=("GET",))
 def search():
     """Search posts."""
     query = request.args.get("q", "").strip()
 
     if not query:
-        return render_template("search.html", posts=[], query=query, errors=[])
+        return render_template("search.html", results=([], []), query=query)
 
-    posts, errors = services.search_posts(query)
-    return render_template("search.html", posts=posts, query=query, errors=errors)
+    page = request.args.get("page", 1, type=int)
+    results = Deferred(lambda: services.search_posts(query, page=page))
+    return stream_page("search.html", results=results, query=query, page=page)
 
 
 @content_bp.route("/attachment/<int:attachment_id>")
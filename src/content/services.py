@@ -3,11 +3,21 @@ Business logic for content operations.
 """
 
 from . import validators, permissions
-from datetime import datetime, timedelta
+from cache import feed_cache, feed_version, search_cache, search_version
+from .pagination import AFTER, BEFORE, decode_cursor, encode_cursor
+from .uploads import UploadSpool
 import os
-import uuid
+import shutil
 from werkzeug.utils import secure_filename
-from .repository import PostRepository, CommentRepository, AttachmentRepository
+import blobs
+from db import after_commit, transaction
+from .repository import (
+    IMAGE_MIME_TYPES,
+    PostRepository,
+    CommentRepository,
+    AttachmentRepository,
+    ContentVersionRepository,
+)
 
 
 class PostResult:
@@ -17,66 +27,112 @@ class PostResult:
         self.errors = errors or []
 
 
-UPLOAD_ROOT = "/data/uploads"
+class PostPage:
+    """One page of a post listing with the cursors of its neighbours."""
 
+    def __init__(self, posts, next_cursor=None, prev_cursor=None):
+        self.posts = posts
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
 
-def _ensure_post_upload_dir(post_id):
-    d = os.path.join(UPLOAD_ROOT, str(post_id))
-    os.makedirs(d, exist_ok=True)
-    return d
+
+class CommentPage:
+    """One page of a post's comments and the cursor of the next page, if any."""
+
+    def __init__(self, comments, next_cursor=None):
+        self.comments = comments
+        self.next_cursor = next_cursor
+
+
+class PostView:
+    """Everything the post detail page shows, loaded in one go."""
+
+    def __init__(self, post, comments, images, files):
+        self.post = post
+        self.comments = comments  # first CommentPage
+        self.images = images
+        self.files = files
+
+    @property
+    def attachments(self):
+        return self.images + self.files
+
+
+COMMENTS_PER_PAGE = 20
+
+
+def _spool(f):
+    """The UploadSpool holding f's content (copied into one if f was not spooled)."""
+    if isinstance(f.stream, UploadSpool):
+        return f.stream, False
+    spool = UploadSpool()
+    f.stream.seek(0)
+    shutil.copyfileobj(f.stream, spool)
+    return spool, True
 
 
 def _save_attachments(post_id, uploader_id, files):
+    """
+    Record the attachments and store their content by SHA-256 (blobs.py).
+    Content that is already stored is not written again.
+    """
     if not files:
         return []
 
-    saved_ids = []
-    target_dir = _ensure_post_upload_dir(post_id)
+    rows, spools, owned = [], [], []
+    try:
+        for f in files:
+            original_name = secure_filename(f.filename or "")
+            if not original_name:
+                continue
+            spool, copied = _spool(f)
+            if copied:
+                owned.append(spool)
+            spools.append(spool)
+            rows.append(
+                (
+                    post_id,
+                    uploader_id,
+                    original_name,
+                    spool.sha256,  # stored_name: the blob's file name
+                    (f.mimetype or "application/octet-stream"),
+                    spool.size,
+                    spool.sha256,
+                )
+            )
 
-    for f in files:
-        original_name = secure_filename(f.filename or "")
-        if not original_name:
-            continue
+        # The inserts take the write lock before the files are checked, so
+        # _reclaim_blobs cannot drop a blob these rows are about to reference
+        with transaction():
+            ids = AttachmentRepository.create_many(rows)
+            for spool in spools:
+                if not blobs.has_blob(spool.sha256):
+                    spool.persist(blobs.blob_target(spool.sha256))
+        return ids
+    finally:
+        for spool in owned:
+            spool.close()
 
-        _, ext = os.path.splitext(original_name)
-        stored_name = f"{uuid.uuid4().hex}{ext.lower()}"
-        stored_path = os.path.join(target_dir, stored_name)
-
-        # Persist file to disk
-        f.stream.seek(0)
-        with open(stored_path, "wb") as out:
-            out.write(f.read())
-
-        # Get size again from the saved file to be accurate
-        size_bytes = os.path.getsize(stored_path)
-        attachment_id = AttachmentRepository.create(
-            post_id,
-            uploader_id,
-            original_name,
-            stored_name,
-            (f.mimetype or "application/octet-stream"),
-            size_bytes,
-        )
-        if attachment_id:
-            saved_ids.append(attachment_id)
 
-    return saved_ids
+def _reclaim_blobs(digests):
+    """Remove the stored files of digests no attachment references any more."""
+    with transaction(immediate=True):
+        for digest in digests - AttachmentRepository.referenced_digests(digests):
+            blobs.remove_blob(digest)
 
 
-def create_post(author_id, title, body, is_public=True, files=None):
-    """Create a new post."""
-    # Check rate limiting (3 minutes between posts)
-    last_post_time = PostRepository.get_last_post_time(author_id)
-    if last_post_time:
-        time_since_last_post = datetime.now() - last_post_time
-        min_interval = timedelta(minutes=3)
-        if time_since_last_post < min_interval:
-            remaining_seconds = int((min_interval - time_since_last_post).total_seconds())
-            return PostResult(
-                ok=False,
-                errors=[f"You must wait {remaining_seconds} seconds before posting again."],
-            )
+def release_blobs(digests):
+    """
+    Called with the digests of deleted attachment rows: once the deletion
+    is committed, their files are removed unless still referenced.
+    """
+    digests = {digest for digest in digests if digest}
+    if digests:
+        after_commit(lambda: _reclaim_blobs(digests))
+
 
+def create_post(author_id, title, body, is_public=True, files=None):
+    """Create a new post. Posting rate is limited by the route (ratelimit)."""
     errors = validators.validate_post_input(title, body)
     # Validate attachments
     errors += validators.validate_attachments(files or [])
@@ -92,39 +148,106 @@ def create_post(author_id, title, body, is_public=True, files=None):
 def get_post_view(post_id, requesting_user_id=None, requesting_is_admin=False):
     """Get post for display (with permissions check)."""
     post = PostRepository.get_by_id(post_id)
-    if not post:
-        return None
 
-    # Check permissions
-    if not permissions.can_view_post(
-        requesting_user_id, post_id, is_admin=requesting_is_admin
+    # Check permissions on the row we already have
+    if not permissions.can_view_post_row(
+        requesting_user_id, post, is_admin=requesting_is_admin
     ):
         return None
 
     return post
 
 
-def get_public_feed(page=1, per_page=10):
-    """Get paginated public feed."""
-    offset = (page - 1) * per_page
-    posts = PostRepository.get_public_posts(limit=per_page, offset=offset)
-    return posts
+def load_post_view(post_id, requesting_user_id=None, requesting_is_admin=False):
+    """
+    Assemble the post detail page: post with author flags, attachments split
+    into images and other files, and the first page of visible comments.
+    The permission check runs on the loaded row, and comments are only
+    fetched once it passes. Returns a PostView, or None if the post is missing or hidden.
+    """
+    rows = PostRepository.get_detail(post_id)
+    post = rows[0] if rows else None
+    if not permissions.can_view_post_row(
+        requesting_user_id, post, is_admin=requesting_is_admin
+    ):
+        return None
+
+    images, files = [], []
+    for row in rows:
+        if row["attachment_id"] is None:
+            continue
+        attachment = {
+            "id": row["attachment_id"],
+            "post_id": row["id"],
+            "original_name": row["original_name"],
+            "stored_name": row["stored_name"],
+            "mime_type": row["mime_type"],
+            "size_bytes": row["size_bytes"],
+            "created_at": row["attachment_created_at"],
+        }
+        (images if row["mime_type"] in IMAGE_MIME_TYPES else files).append(attachment)
+
+    return PostView(post, get_comments_page(post_id), images, files)
+
+
+def _paginate(fetch, page, per_page, cursor):
+    """
+    Fetch one page of a listing. A valid cursor pages by keyset on
+    (created_at, id); otherwise the page number falls back to OFFSET.
+    `page` is only carried along for display and the previous link.
+    Rows come back as card dicts with comment/attachment aggregates.
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        posts = fetch(limit=per_page, offset=(max(page, 1) - 1) * per_page)
+    elif position[0] == BEFORE:
+        posts = fetch(limit=per_page, before=position[1])
+    else:
+        posts = fetch(limit=per_page, after=position[1])
+    posts = PostRepository.with_card_stats(posts)
+
+    next_cursor = encode_cursor(AFTER, posts[-1]) if len(posts) == per_page else None
+    prev_cursor = encode_cursor(BEFORE, posts[0]) if posts and page > 1 else None
+    return PostPage(posts, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def get_content_version():
+    """(version, changed_at) of the last content write, for HTTP validators."""
+    return ContentVersionRepository.get()
+
+
+def get_public_feed(page=1, per_page=10, cursor=None):
+    """
+    Get paginated public feed. Pages are served from the in-process feed
+    cache; any write that changes the feed bumps feed_version, so a stale
+    page is never returned past the commit that changed it.
+    """
+    key = (feed_version.value, page, cursor, per_page)
+    return feed_cache.get_or_load(
+        key, lambda: _paginate(PostRepository.get_public_posts, page, per_page, cursor)
+    )
+
+
+def feed_cache_stats():
+    """Hit/miss/eviction counters of the feed page cache."""
+    return dict(feed_cache.stats(), version=feed_version.value)
 
 
-def get_admin_feed(page=1, per_page=20):
+def get_admin_feed(page=1, per_page=20, cursor=None):
     """Admin: paginated feed of all posts (public and private)."""
-    offset = (page - 1) * per_page
-    return PostRepository.get_all_posts(limit=per_page, offset=offset)
+    return _paginate(PostRepository.get_all_posts, page, per_page, cursor)
 
 
-def get_user_posts(user_id, page=1, per_page=10):
+def get_user_posts(user_id, page=1, per_page=10, cursor=None):
     """Get paginated posts for a specific user (all posts - public and private)."""
-    offset = (page - 1) * per_page
-    posts = PostRepository.get_by_author(user_id, limit=per_page, offset=offset)
-    return posts
 
+    def fetch(**kwargs):
+        return PostRepository.get_by_author(user_id, **kwargs)
+
+    return _paginate(fetch, page, per_page, cursor)
 
-def search_posts(query, limit=50):
+
+def search_posts(query, page=1, per_page=20):
     """Search posts by title, content, and attachment filenames.
 
     Returns tuple: (results, errors)
@@ -136,34 +259,50 @@ def search_posts(query, limit=50):
     if errors:
         return [], errors
 
-    # Search in posts (title and body)
-    posts_from_db = PostRepository.search(query, limit=limit)
-
-    # Also search by attachment filenames
-    posts_with_matching_attachments = PostRepository.search_by_attachment_filename(
-        query, limit=limit
+    # Equivalent spellings of a query share one cache entry
+    normalized = normalize_search_query(query)
+    offset = (max(page, 1) - 1) * per_page
+    key = (search_version.value, normalized, page, per_page)
+    # One ranked full-text query covers titles, bodies and attachment names
+    results = search_cache.get_or_load(
+        key,
+        lambda: PostRepository.with_card_stats(
+            PostRepository.search(normalized, limit=per_page, offset=offset)
+        ),
     )
+    return results, []
+
 
-    # Combine results and remove duplicates
-    seen_ids = set()
-    combined_results = []
+def normalize_search_query(query):
+    """Case-fold and collapse whitespace; the search itself is case-insensitive."""
+    return " ".join(query.casefold().split())
 
-    for post in posts_from_db:
-        if post[0] not in seen_ids:
-            combined_results.append(post)
-            seen_ids.add(post[0])
 
-    for post in posts_with_matching_attachments:
-        if post[0] not in seen_ids:
-            combined_results.append(post)
-            seen_ids.add(post[0])
+def search_cache_stats():
+    """Hit/miss/eviction counters (and hit ratio) of the search result cache."""
+    return dict(search_cache.stats(), version=search_version.value)
 
-    return combined_results[:limit], []
+
+def get_comments_page(post_id, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """One page of a post's visible comments, oldest first, keyed on (created_at, id)."""
+    position = decode_cursor(cursor)
+    after = position[1] if position and position[0] == AFTER else None
+    comments = CommentRepository.get_by_post(post_id, limit=per_page, after=after)
+    next_cursor = (
+        encode_cursor(AFTER, comments[-1]) if len(comments) == per_page else None
+    )
+    return CommentPage(comments, next_cursor=next_cursor)
 
 
-def get_by_post(post_id):
-    """Get all comments for a post."""
-    return CommentRepository.get_by_post(post_id)
+def get_post_comments(
+    post_id, cursor=None, requesting_user_id=None, requesting_is_admin=False
+):
+    """Next page of comments for the detail page, or None if the post is hidden."""
+    if not permissions.can_view_post(
+        requesting_user_id, post_id, is_admin=requesting_is_admin
+    ):
+        return None
+    return get_comments_page(post_id, cursor)
 
 
 def edit_post(post_id, user_id, title, body, is_public=True, files=None):
@@ -190,7 +329,7 @@ def delete_post(post_id, user_id, is_admin=False):
             ok=False, errors=["You don't have permission to delete this post."]
         )
 
-    PostRepository.delete(post_id)
+    release_blobs(PostRepository.delete(post_id))
     return PostResult(ok=True)
 
 
@@ -222,8 +361,11 @@ def get_attachment_file(
     ):
         return None
 
-    directory = _ensure_post_upload_dir(post_id)
-    stored_name = att["stored_name"]
+    if att["sha256"]:
+        path = blobs.blob_path(att["sha256"])
+    else:
+        path = blobs.legacy_path(post_id, att["stored_name"])
+    directory, stored_name = os.path.split(path)
     original_name = att["original_name"]
     mime_type = att["mime_type"]
     return directory, stored_name, original_name, mime_type
@@ -0,0 +1,93 @@
+"""
+Streaming persistence for uploaded attachments.
+
+Werkzeug normally buffers each uploaded file in memory (SpooledTemporaryFile)
+until it is read back and written out by the view. Here the multipart parser
+writes every file straight into a spool file on the same filesystem as
+UPLOAD_ROOT, hashing and measuring it chunk by chunk. Saving an attachment
+is then a rename of the finished spool file, never a copy, and no upload is
+ever held in worker memory.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from flask import Request
+
+from blobs import UPLOAD_ROOT
+from .validators import MAX_FILE_SIZE_BYTES
+
+# Beside UPLOAD_ROOT (same filesystem, so os.replace is a rename) but outside
+# the directory nginx serves
+UPLOAD_SPOOL_DIR = os.path.join(os.path.dirname(UPLOAD_ROOT), ".upload-tmp")
+# Stored files are served by nginx straight from UPLOAD_ROOT, possibly as
+# another user than the app: mkstemp's 0600 would make them unreadable
+STORED_FILE_MODE = 0o644
+# Whole request body; matches nginx's client_max_body_size
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_UPLOAD_REQUEST_BYTES") or 50 * 1024 * 1024)
+
+
+class UploadSpool:
+    """
+    Write target for one uploaded file. Bytes past MAX_FILE_SIZE_BYTES are
+    counted but not stored, so validation can still report the real size.
+    The spool file is removed on close() unless persist() moved it.
+    """
+
+    def __init__(self, directory=UPLOAD_SPOOL_DIR, max_size=MAX_FILE_SIZE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._sha256 = hashlib.sha256()
+        self.max_size = max_size
+        self.size = 0
+        self.persisted = False
+
+    @property
+    def oversized(self):
+        return self.size > self.max_size
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if not self.oversized:
+            self._sha256.update(data)
+            self._file.write(data)
+        return len(data)
+
+    def persist(self, destination):
+        """Atomically move the spooled content to destination."""
+        self._file.flush()
+        os.fchmod(self._file.fileno(), STORED_FILE_MODE)
+        os.fsync(self._file.fileno())
+        os.replace(self.path, destination)
+        self.persisted = True
+
+    def close(self):
+        self._file.close()
+        if not self.persisted:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read / seek / tell / fileno ... for validation and FileStorage
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    Request class whose file uploads are spooled by UploadSpool. Bodies over
+    MAX_CONTENT_LENGTH (set to MAX_REQUEST_BYTES) are refused with 413 from
+    their Content-Length, before any parsing.
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        return UploadSpool()
@@ -93,14 +93,17 @@ def validate_attachments(files):
             errors.append(f"Attachment '{original_name}': file type not allowed.")
             continue
 
-        # Size check (seek to end, then restore position)
-        try:
-            pos = f.stream.tell()
-            f.stream.seek(0, os.SEEK_END)
-            size = f.stream.tell()
-            f.stream.seek(pos)
-        except Exception:
-            size = None
+        # Size check: spooled uploads were measured while streaming;
+        # otherwise seek to end, then restore position
+        size = getattr(f.stream, "size", None)
+        if size is None:
+            try:
+                pos = f.stream.tell()
+                f.stream.seek(0, os.SEEK_END)
+                size = f.stream.tell()
+                f.stream.seek(pos)
+            except Exception:
+                size = None
 
         if size is None or size <= 0:
             errors.append(f"Attachment '{original_name}': could not determine size.")
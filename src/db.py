@@ -1,16 +1,478 @@
+"""
+Database access helpers.
+Connections come from process-wide pools so requests reuse open handles
+instead of reconnecting to SQLite on every request. Each connection is tuned
+with the storage profile from storage.py when it is opened.
+
+Reads and writes are routed separately: repository methods tagged with
+@reads run on read-only connections (one per request, from a pool sized for
+concurrency), while @writes methods share a single writer connection that
+is only held for the duration of the write. Hot-path writes can instead go
+through submit_write(), which hands them to the group-commit writer thread.
+
+Services that perform several writes wrap them in transaction(): every
+repository call inside the block shares one BEGIN/COMMIT on the writer, and
+repositories defer their commit() to the end of the block.
+
+Primary-key lookups tagged @identity_mapped are memoized per request in
+flask.g, so a row is read at most once between writes.
+
+Native ASGI handlers (asgi.py) await database work through
+run_in_db_executor(), which runs it on a dedicated executor instead of
+blocking the event loop.
+"""
+
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import queue
 import sqlite3
-from flask import g
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
 
-DATABASE = "/data/app.db"
+from flask import g, has_app_context
 
-def get_db():
-    if "db" not in g:
-        conn = sqlite3.connect(DATABASE)
+from storage import StorageProfile, WalCheckpointer
+from write_queue import GroupCommitWriter
+
+logger = logging.getLogger(__name__)
+
+DATABASE = os.environ.get("DATABASE_PATH") or "/data/app.db"
+
+# Read pool sizing; the default matches the threads Flask requests run on (asgi.py)
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# SQLite allows a single writer at a time, more connections only add lock contention
+WRITE_POOL_SIZE = int(os.environ.get("DB_WRITE_POOL_SIZE", 1))
+# Threads available to native ASGI handlers for blocking SQLite calls
+EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", POOL_SIZE))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out in time."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of open SQLite connections."""
+
+    def __init__(
+        self,
+        database,
+        max_size=POOL_SIZE,
+        timeout=POOL_TIMEOUT,
+        profile=None,
+        readonly=False,
+    ):
+        self.database = database
+        self.profile = profile
+        self.readonly = readonly
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        # Connections are handed to whichever worker thread checks them out
+        if self.readonly:
+            uri = "file:{}?mode=ro".format(
+                urllib.parse.quote(os.path.abspath(self.database))
+            )
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False)
         conn.row_factory = sqlite3.Row
-        g.db = conn
+        if self.profile is not None:
+            self.profile.apply(conn, readonly=self.readonly)
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening a new one while under max_size."""
+        started = time.monotonic()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._size < self.max_size:
+                    self._size += 1
+                    grow = True
+                else:
+                    grow = False
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s"
+                    )
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable."""
+        try:
+            # Never hand an open transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        """Return pool size and checkout wait statistics."""
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "checkouts": self._checkouts,
+                "wait_avg_ms": (
+                    self._wait_total / self._checkouts * 1000 if self._checkouts else 0.0
+                ),
+                "wait_max_ms": self._wait_max * 1000,
+            }
+
+
+_read_pool = None
+_write_pool = None
+_pool_lock = threading.Lock()
+_checkpointer = None
+_writer = None
+
+# Set by @reads / @writes for the duration of a repository call
+_route = contextvars.ContextVar("db_route", default=None)
+
+
+def _init_pools():
+    global _read_pool, _write_pool, _checkpointer, _writer
+    with _pool_lock:
+        if _write_pool is not None:
+            return
+        profile = StorageProfile.from_env()
+        write_pool = ConnectionPool(
+            DATABASE, max_size=WRITE_POOL_SIZE, profile=profile
+        )
+        # Open the writer first so journal_mode=WAL is in place before readers
+        write_pool.release(write_pool.acquire())
+        _read_pool = ConnectionPool(DATABASE, profile=profile, readonly=True)
+        _writer = GroupCommitWriter(write_pool)
+        _write_pool = write_pool
+        atexit.register(_read_pool.close_all)
+        atexit.register(_write_pool.close_all)
+        # Registered last so it runs first and flushes queued writes
+        atexit.register(_writer.stop)
+        if profile.journal_mode == "wal":
+            _checkpointer = WalCheckpointer(DATABASE, profile)
+            _checkpointer.start()
+            atexit.register(_checkpointer.stop)
+
+
+def get_pool(readonly=False):
+    """Return the process-wide read or write pool, creating them on first use."""
+    if _write_pool is None:
+        _init_pools()
+    return _read_pool if readonly else _write_pool
+
+
+def get_write_db():
+    """Return this request's writer connection, checking it out if needed."""
+    if "db" not in g:
+        g.db = get_pool().acquire()
     return g.db
 
+
+def get_read_db():
+    """Return this request's read-only connection, checking it out if needed."""
+    if "read_db" not in g:
+        g.read_db = get_pool(readonly=True).acquire()
+    return g.read_db
+
+
+def get_db():
+    """
+    Return the connection for the current call site.
+    Inside @reads this is the read-only connection, unless the request has an
+    open write transaction whose changes the read must see. Everything else
+    (including untagged callers) gets the writer connection.
+    """
+    if _route.get() == "read":
+        writer = g.get("db")
+        if writer is None or not writer.in_transaction:
+            return get_read_db()
+    return get_write_db()
+
+
+def _release_writer():
+    db = g.get("db")
+    if db is not None and not db.in_transaction:
+        g.pop("db")
+        get_pool().release(db)
+
+
+def submit_write(sql, params=()):
+    """
+    Queue a single write statement for the group-commit writer.
+    Returns a Future resolving to the cursor's lastrowid once the write is
+    committed: call .result() when the caller must not respond before the
+    write is durable, or drop the future for fire-and-forget writes.
+
+    If this request already holds the writer connection the statement runs
+    inline on it, since the writer thread would otherwise wait on us.
+    """
+    if has_app_context() and "db" in g:
+        future = Future()
+        try:
+            db = g.db
+            cur = db.execute(sql, params)
+            commit(db)
+            future.set_result(cur.lastrowid)
+        except sqlite3.Error as e:
+            logger.error("Queued write failed: %s", sql, exc_info=e)
+            future.set_exception(e)
+        return future
+
+    get_pool()
+    return _writer.submit(sql, params)
+
+
+def in_transaction():
+    """True while the current request is inside a transaction() block."""
+    return has_app_context() and g.get("txn_depth", 0) > 0
+
+
+def commit(db):
+    """Commit a repository write, unless a transaction() block owns the commit."""
+    if not in_transaction():
+        db.commit()
+
+
+@contextlib.contextmanager
+def transaction(immediate=False):
+    """
+    Unit of work: run every repository call in the block inside a single
+    BEGIN/COMMIT on the writer connection. Nested blocks join the outermost
+    one. The transaction is rolled back if the block raises.
+    immediate=True takes the write lock at BEGIN, for blocks that read and
+    then act on what they read (even outside the database) and must not
+    interleave with another writer.
+    """
+    if in_transaction():
+        g.txn_depth += 1
+        try:
+            yield g.db
+        finally:
+            g.txn_depth -= 1
+        return
+
+    checked_out = "db" not in g
+    db = get_write_db()
+    if db.in_transaction:
+        db.commit()
+    db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    g.txn_depth = 1
+    g.after_commit = []
+    token = _route.set("write")
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        g.after_commit = []
+        raise
+    else:
+        db.commit()
+    finally:
+        _route.reset(token)
+        g.txn_depth = 0
+        if checked_out:
+            _release_writer()
+
+    callbacks, g.after_commit = g.after_commit, []
+    for fn in callbacks:
+        fn()
+
+
+def after_commit(fn):
+    """
+    Run fn once the current write is committed: at the end of the enclosing
+    transaction(), or right away outside one. Dropped on rollback, so caches
+    are never invalidated for (or refilled from) data that did not land.
+    """
+    if in_transaction():
+        g.after_commit.append(fn)
+    else:
+        fn()
+
+
+def inserted_ids(db, count):
+    """
+    Ids of the last `count` rows inserted on db by a single executemany().
+    Only valid inside one write transaction on an AUTOINCREMENT table, where
+    SQLite hands out consecutive rowids because no other writer can interleave.
+    """
+    if count <= 0:
+        return []
+    last = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last - count + 1, last + 1))
+
+
+def reads(fn):
+    """Tag a repository method as read-only so it runs on a reader connection."""
+
+    @functools.wraps(fn)
+    def wrapped(*args, **kwargs):
+        token = _route.set("read")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _route.reset(token)
+
+    return wrapped
+
+
+def writes(fn):
+    """
+    Tag a repository method as a write. The writer connection is handed back
+    to the pool once the outermost write returns, so concurrent requests only
+    contend for it while they are actually writing. Any write also empties
+    the request's identity map.
+    """
+
+    @functools.wraps(fn)
+    def wrapped(*args, **kwargs):
+        # Only release a writer this call checked out, not one the caller holds
+        release = _route.get() != "write" and "db" not in g
+        token = _route.set("write")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _route.reset(token)
+            g.pop("identity_map", None)
+            if release:
+                _release_writer()
+
+    return wrapped
+
+
+_NOT_LOADED = object()
+
+
+def identity_mapped(fn):
+    """
+    Memoize a primary-key lookup for the rest of the request: repeated calls
+    with the same arguments (from services, permission checks, routes) read
+    the row once. The map lives in flask.g and is dropped by every @writes
+    call, so a lookup after a write sees the new row.
+    """
+
+    @functools.wraps(fn)
+    def wrapped(*args, **kwargs):
+        if not has_app_context():
+            return fn(*args, **kwargs)
+        identity_map = g.setdefault("identity_map", {})
+        key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+        row = identity_map.get(key, _NOT_LOADED)
+        if row is _NOT_LOADED:
+            row = identity_map[key] = fn(*args, **kwargs)
+        return row
+
+    return wrapped
+
+
 def close_db(e=None):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
+    read_db = g.pop("read_db", None)
+    if read_db is not None:
+        get_pool(readonly=True).release(read_db)
+
+
+def pool_stats():
+    return {
+        "read": get_pool(readonly=True).stats(),
+        "write": get_pool().stats(),
+    }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the dedicated DB executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=EXECUTOR_WORKERS, thread_name_prefix="db"
+                )
+                atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+async def run_in_db_executor(fn, *args, **kwargs):
+    """
+    Await fn(*args, **kwargs) on the DB executor. The caller's context
+    variables are copied into the worker; fn pushes its own app context
+    when it needs flask.g and the pooled connections.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(ctx.run, fn, *args, **kwargs)
+    )
+
+
+def writer_stats():
+    """Batch statistics of the group-commit writer."""
+    get_pool()
+    return _writer.stats()
+
+
+def wal_stats():
+    """Last WAL checkpoint report, or None when WAL mode is not in use."""
+    get_pool()
+    return _checkpointer.stats() if _checkpointer is not None else None
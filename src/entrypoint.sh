@@ -17,7 +17,11 @@ if [ -n "$INIT_DATA" ]; then
   esac
 fi
 
-# --- 2. Debug Image Seeding ---
+# --- 2. Schema Migrations ---
+# Upgrades an existing database in place (no-op when already up to date)
+python3 /workspace/migrations.py
+
+# --- 3. Debug Image Seeding ---
 if [ -n "$DEBUG" ]; then
   case "$DEBUG" in
     1|true|True|TRUE|yes|Yes)
@@ -2,12 +2,16 @@
 import sqlite3
 import os
 
-DB_FILE = "/data/app.db"
+import migrations
+
+DB_FILE = os.environ.get("DATABASE_PATH") or "/data/app.db"
 
 
 def init_db():
     conn = sqlite3.connect(DB_FILE)
     conn.execute("PRAGMA foreign_keys = OFF;")
+    # Tables are recreated from the baseline schema below
+    conn.execute("PRAGMA user_version = 0;")
     cur = conn.cursor()
 
     # ================================
@@ -157,6 +161,10 @@ def init_db():
         print("Initial image example post created.")
         print("Title: Image Attachment Example")
         print("Post is located at: /content/post/3")
+
+    # Bring the baseline schema up to the latest version. Runs after seeding
+    # so migrations backfill derived data (feed, search index, excerpts).
+    migrations.migrate(conn)
     conn.close()
     print(f"Database initialized successfully: {DB_FILE}")
 
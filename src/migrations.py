@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+Upgrades an existing database in place, without dropping data. The schema
+version is stored in PRAGMA user_version; init_db.py creates the baseline
+schema at version 0 and every migration below moves it one version up.
+
+Run directly to upgrade /data/app.db (or DATABASE_PATH):
+    python3 migrations.py
+"""
+
+import os
+import sqlite3
+
+import blobs
+
+DB_FILE = os.environ.get("DATABASE_PATH") or "/data/app.db"
+
+
+def _0001_hot_path_indexes(conn):
+    """Composite indexes for the feed, per-author listings and comment lookups."""
+    # Public feed: WHERE is_public = 1 ORDER BY created_at DESC
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_posts_public_created ON posts(is_public, created_at)"
+    )
+    # get_by_author: WHERE author_id = ? ORDER BY created_at
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_posts_author_created ON posts(author_id, created_at)"
+    )
+    # Admin feed: every post ORDER BY created_at DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_created ON posts(created_at)")
+    # Post detail: WHERE post_id = ? ORDER BY created_at
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments(post_id, created_at)"
+    )
+    # Account deletion: DELETE FROM comments WHERE author_id = ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_author ON comments(author_id)")
+    # Admin user list: ORDER BY created_at DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
+
+
+def _0002_attachments_post_order_index(conn):
+    """Serve get_by_post's ORDER BY created_at from the index instead of a sort."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attachments_post_created ON attachments(post_id, created_at)"
+    )
+    # Superseded: post_id is the leading column of the new index
+    conn.execute("DROP INDEX IF EXISTS idx_attachments_post_id")
+
+
+def _0003_feed_entries(conn):
+    """Denormalized public feed: one row per visible post, no join on read."""
+    conn.execute("DROP TABLE IF EXISTS feed_entries")
+    conn.execute(
+        """
+        CREATE TABLE feed_entries (
+            post_id INTEGER PRIMARY KEY,
+            author_id INTEGER NOT NULL,
+            author_email TEXT NOT NULL,
+            title TEXT NOT NULL,
+            excerpt TEXT NOT NULL,
+            created_at DATETIME NOT NULL
+        )
+        """
+    )
+    # Feed page: ORDER BY created_at DESC, post_id DESC (post_id is the rowid)
+    conn.execute("CREATE INDEX idx_feed_entries_created ON feed_entries(created_at)")
+    # Author disable / rename / deletion touch every entry of one author
+    conn.execute("CREATE INDEX idx_feed_entries_author ON feed_entries(author_id)")
+    conn.execute(
+        """
+        INSERT INTO feed_entries (post_id, author_id, author_email, title, excerpt, created_at)
+        SELECT p.id, p.author_id, u.email, p.title, substr(p.body, 1, 300), p.created_at
+        FROM posts p
+        JOIN users u ON p.author_id = u.id
+        WHERE p.is_public = 1 AND u.disabled = 0 AND u.disabled_by_admin = 0
+        """
+    )
+
+
+def _0004_posts_fts(conn):
+    """
+    FTS5 index over post title, body and attachment names (rowid = post id),
+    kept in sync by triggers on posts and attachments.
+    """
+    for trigger in (
+        "posts_fts_insert",
+        "posts_fts_update",
+        "posts_fts_delete",
+        "attachments_fts_insert",
+        "attachments_fts_delete",
+    ):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS posts_fts")
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE posts_fts USING fts5(
+            title, body, attachments,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+    # ORDER BY rank: title matches weigh most, then attachment names, then body
+    conn.execute(
+        "INSERT INTO posts_fts (posts_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')"
+    )
+    conn.execute(
+        """
+        INSERT INTO posts_fts (rowid, title, body, attachments)
+        SELECT p.id, p.title, p.body,
+               COALESCE((SELECT group_concat(a.original_name, ' ')
+                         FROM attachments a WHERE a.post_id = p.id), '')
+        FROM posts p
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, title, body, attachments)
+            VALUES (new.id, new.title, new.body, '');
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER posts_fts_update AFTER UPDATE OF title, body ON posts BEGIN
+            UPDATE posts_fts SET title = new.title, body = new.body
+            WHERE rowid = new.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    # Attachment changes rewrite the post's list of names
+    for trigger, event, row in (
+        ("attachments_fts_insert", "INSERT", "new"),
+        ("attachments_fts_delete", "DELETE", "old"),
+    ):
+        conn.execute(
+            f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON attachments BEGIN
+                UPDATE posts_fts
+                SET attachments = COALESCE((SELECT group_concat(original_name, ' ')
+                                            FROM attachments
+                                            WHERE post_id = {row}.post_id), '')
+                WHERE rowid = {row}.post_id;
+            END
+            """
+        )
+
+
+def _0005_posts_excerpt(conn):
+    """Stored body preview, so list pages never read the full body."""
+    conn.execute("ALTER TABLE posts ADD COLUMN excerpt TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE posts SET excerpt = substr(body, 1, 300)")
+
+
+def _0006_posts_comment_count(conn):
+    """
+    posts.comment_count: visible comments (author neither self- nor
+    admin-disabled), kept up to date by triggers on comments and users.
+    """
+    for trigger in (
+        "comments_count_insert",
+        "comments_count_delete",
+        "users_comment_visibility",
+    ):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("ALTER TABLE posts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        """
+        UPDATE posts SET comment_count = (
+            SELECT COUNT(*) FROM comments c JOIN users u ON c.author_id = u.id
+            WHERE c.post_id = posts.id AND u.disabled = 0 AND u.disabled_by_admin = 0
+        )
+        """
+    )
+    for trigger, event, row, delta in (
+        ("comments_count_insert", "INSERT", "new", "+ 1"),
+        ("comments_count_delete", "DELETE", "old", "- 1"),
+    ):
+        conn.execute(
+            f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON comments
+            WHEN (SELECT disabled = 0 AND disabled_by_admin = 0
+                  FROM users WHERE id = {row}.author_id)
+            BEGIN
+                UPDATE posts SET comment_count = comment_count {delta}
+                WHERE id = {row}.post_id;
+            END
+            """
+        )
+    # Disabling or re-enabling an author hides or shows all of their comments
+    conn.execute(
+        """
+        CREATE TRIGGER users_comment_visibility
+        AFTER UPDATE OF disabled, disabled_by_admin ON users
+        WHEN (old.disabled = 0 AND old.disabled_by_admin = 0)
+             != (new.disabled = 0 AND new.disabled_by_admin = 0)
+        BEGIN
+            UPDATE posts SET comment_count = comment_count + (
+                SELECT CASE WHEN new.disabled = 0 AND new.disabled_by_admin = 0
+                            THEN COUNT(*) ELSE -COUNT(*) END
+                FROM comments c WHERE c.post_id = posts.id AND c.author_id = new.id
+            )
+            WHERE id IN (SELECT post_id FROM comments WHERE author_id = new.id);
+        END
+        """
+    )
+
+
+def _0007_content_version(conn):
+    """
+    Single-row content_version: a counter and timestamp bumped by triggers
+    on every write that can change a rendered feed or post page. Used as
+    the HTTP validator (ETag / Last-Modified) for those pages.
+    """
+    sources = (
+        ("posts", "INSERT"),
+        ("posts", "UPDATE"),
+        ("posts", "DELETE"),
+        ("comments", "INSERT"),
+        ("comments", "DELETE"),
+        ("attachments", "INSERT"),
+        ("attachments", "DELETE"),
+        ("users", "UPDATE OF email, disabled, disabled_by_admin"),
+        ("users", "DELETE"),
+    )
+    for table, event in sources:
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_{event.split()[0].lower()}_content_version")
+    conn.execute("DROP TABLE IF EXISTS content_version")
+    conn.execute(
+        """
+        CREATE TABLE content_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO content_version (id, version, changed_at) "
+        "VALUES (1, 1, strftime('%Y-%m-%dT%H:%M:%S', 'now'))"
+    )
+    for table, event in sources:
+        conn.execute(
+            f"""
+            CREATE TRIGGER {table}_{event.split()[0].lower()}_content_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE content_version
+                SET version = version + 1,
+                    changed_at = strftime('%Y-%m-%dT%H:%M:%S', 'now')
+                WHERE id = 1;
+            END
+            """
+        )
+
+
+def _0008_feed_entries_updated_at(conn):
+    """Feed rows carry updated_at, the version key of cached post cards."""
+    conn.execute("ALTER TABLE feed_entries ADD COLUMN updated_at DATETIME")
+    conn.execute(
+        """
+        UPDATE feed_entries
+        SET updated_at = (SELECT p.updated_at FROM posts p WHERE p.id = feed_entries.post_id)
+        """
+    )
+
+
+def _0009_content_addressed_attachments(conn):
+    """
+    Attachments reference their file by SHA-256 (blobs.py). Existing per-post
+    files are moved into the store afterwards, by _fold_legacy_uploads.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(attachments)")}
+    # An earlier version of this step committed midway and may have added it
+    if "sha256" not in columns:
+        conn.execute("ALTER TABLE attachments ADD COLUMN sha256 TEXT")
+    # Reference lookups when a file may be reclaimed
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON attachments(sha256)"
+    )
+
+
+# Ordered list of (version, migration). Never edit or reorder applied entries,
+# only append new ones.
+MIGRATIONS = [
+    (1, _0001_hot_path_indexes),
+    (2, _0002_attachments_post_order_index),
+    (3, _0003_feed_entries),
+    (4, _0004_posts_fts),
+    (5, _0005_posts_excerpt),
+    (6, _0006_posts_comment_count),
+    (7, _0007_content_version),
+    (8, _0008_feed_entries_updated_at),
+    (9, _0009_content_addressed_attachments),
+]
+
+
+def _fold_legacy_uploads(conn):
+    """Move per-post attachment files into the content-addressed store."""
+    blobs.fold_legacy_files(conn)
+
+
+# (version, step) pairs run by after_migrations() once the database is at
+# least at that version. They touch files outside the database, so they run
+# after the migration's commit, on every start, and must be idempotent.
+POST_MIGRATION_STEPS = [
+    (9, _fold_legacy_uploads),
+]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(conn, target=None):
+    """
+    Apply every pending migration up to target (default: latest), each in
+    its own transaction together with the version bump.
+    Returns the list of versions applied.
+    """
+    target = latest_version() if target is None else target
+    applied = []
+    for version, step in MIGRATIONS:
+        if version <= current_version(conn) or version > target:
+            continue
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            # PRAGMA does not accept bound parameters; version is an int literal
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def after_migrations(conn):
+    """Run the post-migration steps the database's version has reached."""
+    version = current_version(conn)
+    for required, step in POST_MIGRATION_STEPS:
+        if version >= required:
+            step(conn)
+
+
+def main():
+    if not os.path.exists(DB_FILE):
+        print(f"Database {DB_FILE} does not exist yet, skipping migrations.")
+        return
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        before = current_version(conn)
+        applied = migrate(conn)
+        after_migrations(conn)
+    finally:
+        conn.close()
+    if applied:
+        print(f"Database migrated from version {before} to {applied[-1]}.")
+    else:
+        print(f"Database already at version {before}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Request rate limiting for abuse-prone endpoints (posting, comments, search,
+login, MFA, password-reset mails).
+
+Limits are applied with the @rate_limit decorator, before the view body runs,
+so rejected requests never reach password hashing or SQL. Two algorithms:
+
+- TokenBucket(capacity, period): bursts of up to `capacity`, refilled at
+  capacity/period tokens per second.
+- SlidingWindow(limit, period): at most `limit` hits in any `period` seconds
+  (sliding window counter, weighted over the previous fixed window).
+
+A view that turns out not to do what the limit protects (e.g. a rejected
+submission) can hand its hit back with refund(name).
+
+Counters live in a store. MemoryStore (default) is sharded and per worker;
+SQLiteStore keeps them in a small database file shared by every worker on
+the host. RATE_LIMIT_STORE selects it ("memory" or "sqlite").
+"""
+
+import functools
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request, session
+from werkzeug.exceptions import TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "t")
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE") or "memory"
+RATE_LIMIT_DB_PATH = os.environ.get("RATE_LIMIT_DB_PATH") or "/data/ratelimit.db"
+RATE_LIMIT_SHARDS = int(os.environ.get("RATE_LIMIT_SHARDS") or 16)
+# Tracked keys per shard before the least recently hit are dropped
+RATE_LIMIT_SHARD_KEYS = int(os.environ.get("RATE_LIMIT_SHARD_KEYS") or 10000)
+
+
+class TokenBucket:
+    """Allows bursts of `capacity` hits, refilled over `period` seconds."""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        # A bucket untouched for a whole period is full again: same as absent
+        self.ttl = period
+
+    def step(self, state, now):
+        """Return (new_state, retry_after); retry_after is 0 when allowed."""
+        tokens, stamp = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+        if tokens >= 1:
+            return (tokens - 1, now), 0
+        return (tokens, now), (1 - tokens) / self.rate
+
+    def refund(self, state, now):
+        """Return (new_state, 0) with the token taken by step() put back."""
+        if state is None:
+            return None, 0
+        tokens, stamp = state
+        tokens = min(self.capacity, tokens + (now - stamp) * self.rate + 1)
+        return (tokens, now), 0
+
+
+class SlidingWindow:
+    """Allows `limit` hits in any `period` seconds."""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.ttl = 2 * period
+
+    def step(self, state, now):
+        """Return (new_state, retry_after); retry_after is 0 when allowed."""
+        window = int(now // self.period)
+        start, current, previous = state or (window, 0, 0)
+        if window != start:
+            previous = current if window == start + 1 else 0
+            current = 0
+        elapsed = now / self.period - window
+        if previous * (1 - elapsed) + current + 1 <= self.limit:
+            return (window, current + 1, previous), 0
+
+        window_end = (window + 1) * self.period
+        room = self.limit - 1 - current
+        if previous and room >= 0:
+            # The previous window's weight decays until the hit fits
+            retry_after = (window + 1 - room / previous) * self.period - now
+        else:
+            retry_after = window_end - now
+        return (window, current, previous), retry_after
+
+    def refund(self, state, now):
+        """Return (new_state, 0) without the hit counted by step()."""
+        if state is None:
+            return None, 0
+        start, current, previous = state
+        if start == int(now // self.period) and current:
+            current -= 1
+        return (start, current, previous), 0
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+
+class MemoryStore:
+    """
+    Per-process counters, split across shards with their own locks so
+    concurrent requests for different keys do not serialize. Each shard keeps
+    at most `max_keys` entries, dropping expired ones first, then the least
+    recently hit.
+    """
+
+    def __init__(self, shards=RATE_LIMIT_SHARDS, max_keys=RATE_LIMIT_SHARD_KEYS):
+        self._shards = [_Shard() for _ in range(shards)]
+        self.max_keys = max_keys
+
+    def update(self, key, step, ttl):
+        """Atomically replace key's state with step(state, now)[0]; return retry_after."""
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = time.time()
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            state = entry[1] if entry and entry[0] > now else None
+            state, retry_after = step(state, now)
+            shard.entries[key] = (now + ttl, state)
+            if len(shard.entries) > self.max_keys:
+                self._prune(shard, now)
+        return retry_after
+
+    def _prune(self, shard, now):
+        for key in [k for k, (expires_at, _) in shard.entries.items() if expires_at <= now]:
+            del shard.entries[key]
+        while len(shard.entries) > self.max_keys:
+            shard.entries.popitem(last=False)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+
+
+class SQLiteStore:
+    """
+    Counters in a separate SQLite file, so every worker on the host sees the
+    same limits. Kept out of the application database: limiter updates never
+    wait behind, or hold up, application writes.
+    """
+
+    # Expired rows are deleted every this many updates (per process)
+    PURGE_EVERY = 1000
+
+    def __init__(self, path=RATE_LIMIT_DB_PATH, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._updates = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def update(self, key, step, ttl):
+        """Atomically replace key's state with step(state, now)[0]; return retry_after."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT state, expires_at FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            state = json.loads(row[0]) if row and row[1] > now else None
+            state, retry_after = step(state, now)
+            conn.execute(
+                """
+                INSERT INTO rate_limits (key, state, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state,
+                                               expires_at = excluded.expires_at
+                """,
+                (key, json.dumps(state), now + ttl),
+            )
+            self._updates += 1
+            if self._updates % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def clear(self):
+        self._connection().execute("DELETE FROM rate_limits")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide counter store selected by RATE_LIMIT_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if RATE_LIMIT_STORE == "sqlite":
+                    _store = SQLiteStore()
+                else:
+                    _store = MemoryStore()
+    return _store
+
+
+# Request keys: who a limit is counted against. None means "not limited".
+
+
+def client_ip():
+    # remote_addr is the client address once ProxyFix has applied X-Forwarded-For
+    return request.remote_addr
+
+
+def session_value(name):
+    return lambda: session.get(name)
+
+
+def form_value(name):
+    """Case-folded form field, e.g. the e-mail address an attack targets."""
+
+    def key():
+        value = request.form.get(name, "").strip().lower()
+        return value or None
+
+    return key
+
+
+def rate_limit(name, limiter, key=client_ip, methods=("POST",), on_limit=None):
+    """
+    Count each matching request against `limiter` under (name, key()).
+    Over the limit, the view is not called: on_limit(retry_after) provides
+    the response, or 429 Too Many Requests is raised with Retry-After.
+    Store failures are logged and let the request through.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if RATE_LIMIT_ENABLED and request.method in methods:
+                identity = key()
+                if identity is not None:
+                    try:
+                        retry_after = get_store().update(
+                            f"{name}:{identity}", limiter.step, limiter.ttl
+                        )
+                    except Exception:
+                        logger.exception("Rate limit store failed for %s", name)
+                        retry_after = 0
+                    if retry_after:
+                        retry_after = max(1, math.ceil(retry_after))
+                        if on_limit is not None:
+                            return on_limit(retry_after)
+                        raise TooManyRequests(retry_after=retry_after)
+                    g.setdefault("rate_limit_hits", {})[name] = (
+                        f"{name}:{identity}",
+                        limiter,
+                    )
+            return view(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def refund(name):
+    """
+    Give back the hit this request counted against the `name` limit, for a
+    request that did not end up doing what the limit protects. A no-op when
+    nothing was counted.
+    """
+    hit = g.get("rate_limit_hits", {}).pop(name, None)
+    if hit is None:
+        return
+    store_key, limiter = hit
+    try:
+        get_store().update(store_key, limiter.refund, limiter.ttl)
+    except Exception:
+        logger.exception("Rate limit refund failed for %s", name)
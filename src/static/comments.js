@@ -0,0 +1,25 @@
+/**
+ * Post detail page: load further pages of comments on demand.
+ * The "Load more comments" link points at the comments fragment route; the
+ * fetched HTML replaces the link (and brings its own link if more remain).
+ */
+
+document.addEventListener("click", function (event) {
+    const link = event.target.closest("[data-load-more-comments]");
+    if (!link) return;
+    event.preventDefault();
+    link.textContent = "Loading…";
+
+    fetch(link.href, { credentials: "same-origin" })
+        .then(function (response) {
+            if (!response.ok) throw new Error(response.status);
+            return response.text();
+        })
+        .then(function (html) {
+            link.insertAdjacentHTML("beforebegin", html);
+            link.remove();
+        })
+        .catch(function () {
+            link.textContent = "Load more comments";
+        });
+});
@@ -0,0 +1,192 @@
+"""
+SQLite storage tuning.
+Defines the pragma profile applied to every connection opened by db.py and
+a background task that checkpoints the WAL so it cannot grow without bound.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = {"wal", "delete", "truncate", "persist", "memory"}
+SYNCHRONOUS_MODES = {"off", "normal", "full", "extra"}
+TEMP_STORES = {"default", "file", "memory"}
+
+
+def _env(name, default):
+    """Read a setting from the environment, treating empty values as unset."""
+    value = os.environ.get(name, "").strip()
+    return value if value else default
+
+
+def _choice(name, default, allowed):
+    value = _env(name, default).lower()
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {sorted(allowed)}, got '{value}'")
+    return value
+
+
+class StorageProfile:
+    """Connection-level pragmas, configurable from the environment."""
+
+    def __init__(
+        self,
+        journal_mode="wal",
+        synchronous="normal",
+        cache_size=-16000,
+        mmap_size=128 * 1024 * 1024,
+        temp_store="memory",
+        busy_timeout=5000,
+        journal_size_limit=64 * 1024 * 1024,
+    ):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.temp_store = temp_store
+        self.busy_timeout = busy_timeout
+        self.journal_size_limit = journal_size_limit
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a profile from DB_* environment variables:
+        DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE (pages, or KiB if
+        negative), DB_MMAP_SIZE (bytes), DB_TEMP_STORE, DB_BUSY_TIMEOUT (ms)
+        and DB_JOURNAL_SIZE_LIMIT (bytes).
+        """
+        return cls(
+            journal_mode=_choice("DB_JOURNAL_MODE", "wal", JOURNAL_MODES),
+            synchronous=_choice("DB_SYNCHRONOUS", "normal", SYNCHRONOUS_MODES),
+            cache_size=int(_env("DB_CACHE_SIZE", -16000)),
+            mmap_size=int(_env("DB_MMAP_SIZE", 128 * 1024 * 1024)),
+            temp_store=_choice("DB_TEMP_STORE", "memory", TEMP_STORES),
+            busy_timeout=int(_env("DB_BUSY_TIMEOUT", 5000)),
+            journal_size_limit=int(_env("DB_JOURNAL_SIZE_LIMIT", 64 * 1024 * 1024)),
+        )
+
+    def apply(self, conn, readonly=False):
+        """
+        Apply the profile to a freshly opened connection.
+        Read-only connections skip the pragmas that change the database file.
+        """
+        # busy_timeout first so the journal_mode switch can wait on other writers
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        if not readonly:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+            conn.execute(
+                f"PRAGMA journal_size_limit = {int(self.journal_size_limit)}"
+            )
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+
+
+class WalCheckpointer:
+    """
+    Background thread that periodically runs a passive WAL checkpoint and
+    escalates to a truncating checkpoint once the WAL grows past a threshold.
+    """
+
+    def __init__(self, database, profile, interval=None, truncate_threshold=None):
+        self.database = database
+        self.profile = profile
+        self.interval = (
+            interval
+            if interval is not None
+            else float(_env("DB_CHECKPOINT_INTERVAL", 30))
+        )
+        self.truncate_threshold = (
+            truncate_threshold
+            if truncate_threshold is not None
+            else int(_env("DB_CHECKPOINT_TRUNCATE_BYTES", 32 * 1024 * 1024))
+        )
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last = {
+            "wal_bytes": 0,
+            "wal_frames": 0,
+            "checkpointed_frames": 0,
+            "busy": False,
+            "mode": None,
+            "at": None,
+        }
+
+    @property
+    def wal_path(self):
+        return self.database + "-wal"
+
+    def wal_size(self):
+        """Current size of the WAL file in bytes (0 if absent)."""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="wal-checkpointer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def checkpoint(self, conn):
+        """Run one checkpoint on conn and record the result."""
+        size_before = self.wal_size()
+        mode = "TRUNCATE" if size_before >= self.truncate_threshold else "PASSIVE"
+        busy, wal_frames, checkpointed = conn.execute(
+            f"PRAGMA wal_checkpoint({mode})"
+        ).fetchone()
+
+        if mode == "TRUNCATE":
+            if busy:
+                logger.warning(
+                    "WAL at %d bytes could not be truncated (readers busy)",
+                    size_before,
+                )
+            else:
+                logger.info("WAL truncated from %d bytes", size_before)
+
+        with self._lock:
+            self._last = {
+                "wal_bytes": self.wal_size(),
+                "wal_frames": wal_frames,
+                "checkpointed_frames": checkpointed,
+                "busy": bool(busy),
+                "mode": mode,
+                "at": time.time(),
+            }
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._last)
+
+    def _run(self):
+        conn = None
+        while not self._stop.wait(self.interval):
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.database, check_same_thread=False)
+                    conn.execute(f"PRAGMA busy_timeout = {int(self.profile.busy_timeout)}")
+                self.checkpoint(conn)
+            except sqlite3.Error:
+                logger.exception("WAL checkpoint failed")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+        if conn is not None:
+            conn.close()
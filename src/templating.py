@@ -0,0 +1,115 @@
+"""
+Template helpers shared by every blueprint.
+
+{% cache key, ... %} ... {% endcache %} renders its body once per key and
+serves the stored HTML afterwards (cache.fragment_cache). The key must name
+everything the body shows; keep per-request values such as csrf_token()
+outside the block.
+
+stream_page() sends a page while it renders: the layout goes out first and
+the rows follow as the template reaches them. Data passed as Deferred is
+only loaded when the template first touches it. Until every Deferred of the
+page has loaded, output is passed on as Jinja yields it, so the layout has
+been handed to the server before the query runs; only the rows after it are
+coalesced into larger chunks.
+"""
+
+from flask import current_app, request, stream_template
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from cache import fragment_cache
+
+# Bytes gathered before a chunk is handed to the server once the page data
+# is loaded; Jinja itself yields one tiny string per template node.
+STREAM_CHUNK_SIZE = 8 * 1024
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render", [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        # url_for() output depends on the mount point (X-Forwarded-Prefix)
+        return fragment_cache.get_or_load((request.script_root, *key), caller)
+
+
+class Deferred:
+    """
+    A template value computed on first use. Attribute access, iteration,
+    truthiness and len() go to the loaded value.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._value = None
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def value(self):
+        if not self._loaded:
+            self._value = self._load()
+            self._loaded = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.value, name)
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+
+def _coalesce(chunks, deferred=(), size=STREAM_CHUNK_SIZE):
+    """
+    Join template output into chunks of about `size` bytes. While any of the
+    deferred values is still unloaded every chunk is passed on at once: the
+    next one may be what triggers the load, and what precedes it must not
+    wait for the query.
+    """
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size or not all(value.loaded for value in deferred):
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_page(template_name, **context):
+    """
+    Streamed equivalent of render_template(). The status line and headers
+    (including the session cookie) are sent before the template runs, so a
+    streamed template must not write to the session: no csrf_token(), no
+    get_flashed_messages().
+    """
+    deferred = [value for value in context.values() if isinstance(value, Deferred)]
+    response = current_app.response_class(
+        _coalesce(stream_template(template_name, **context), deferred),
+        mimetype="text/html",
+    )
+    # Let nginx pass chunks through instead of buffering the whole page
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
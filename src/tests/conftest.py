@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="app-tests-")
+# Must be set before db / init_db / app are imported
+os.environ["DATABASE_PATH"] = os.path.join(_workdir, "app.db")
+os.environ["DEBUG"] = "False"
+os.environ["DB_CHECKPOINT_INTERVAL"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "False"
+os.environ.setdefault("SECRET_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import init_db
+
+
+@pytest.fixture(scope="session")
+def app():
+    init_db.init_db()
+    from app import app
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def upload_root(tmp_path, monkeypatch):
+    """Point the attachment store at a temporary directory."""
+    import blobs
+
+    root = tmp_path / "uploads"
+    monkeypatch.setattr(blobs, "UPLOAD_ROOT", str(root))
+    monkeypatch.setattr(blobs, "OBJECTS_DIR", str(root / "objects"))
+    return root
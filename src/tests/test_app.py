@@ -0,0 +1,16 @@
+def _log_in(client, role):
+    with client.session_transaction() as session:
+        session["user_id"] = 2 if role == "admin" else 1
+        session["role"] = role
+
+
+def test_admin_stats_reports_database_and_cache_counters(client):
+    _log_in(client, "admin")
+    stats = client.get("/admin/stats").get_json()
+    assert {"pools", "writer", "wal", "feed_cache", "search_cache"} <= stats.keys()
+    assert stats["pools"]["write"]["max_size"] >= 1
+
+
+def test_admin_stats_is_admin_only(client):
+    _log_in(client, "user")
+    assert client.get("/admin/stats").status_code == 302
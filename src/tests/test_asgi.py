@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from werkzeug.security import generate_password_hash
+
+import blobs
+from asgi import PooledWsgiToAsgi
+from auth.repository import UserRepository
+from content.repository import AttachmentRepository, PostRepository
+
+
+async def _request(asgi_app, path, headers=()):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+def _call(asgi_app, path):
+    return asyncio.run(_request(asgi_app, path))
+
+
+def _attachment(app, is_public):
+    content = b"attachment bytes " * 10000
+    digest, size = "ef" * 32, len(content)
+    with open(blobs.blob_target(digest), "wb") as f:
+        f.write(content)
+    with app.app_context():
+        user_id = UserRepository.create(
+            f"asgi-{is_public}@x.org", generate_password_hash("Correct-Horse-1")
+        )
+        post_id = PostRepository.create(user_id, "ASGI", "Body", is_public)
+        attachment_id = AttachmentRepository.create(
+            post_id, user_id, "résumé.pdf", digest, "application/pdf", size, digest
+        )
+    return attachment_id, content
+
+
+def test_attachment_download_is_served_natively(app, upload_root, monkeypatch):
+    from app import asgi_app
+
+    attachment_id, content = _attachment(app, is_public=True)
+    # The Flask view must not be involved
+    monkeypatch.setattr(asgi_app, "fallback", None)
+    status, headers, body = _call(asgi_app, f"/content/attachment/{attachment_id}")
+
+    assert status == 200
+    assert body == content
+    assert headers[b"content-length"] == str(len(content)).encode()
+    assert headers[b"content-disposition"].startswith(b"attachment; filename=")
+    assert b"filename*=UTF-8''r%C3%A9sum%C3%A9.pdf" in headers[b"content-disposition"]
+
+
+def test_attachment_without_permission_falls_back_to_flask(app, upload_root):
+    from app import asgi_app
+
+    attachment_id, _ = _attachment(app, is_public=False)
+    status, _, _ = _call(asgi_app, f"/content/attachment/{attachment_id}")
+    assert status == 404
+
+
+def test_flask_requests_run_concurrently():
+    def slow_wsgi(environ, start_response):
+        time.sleep(0.3)
+        start_response("200 OK", [])
+        return [b"done"]
+
+    asgi_app = PooledWsgiToAsgi(slow_wsgi)
+
+    async def four_requests():
+        started = time.monotonic()
+        await asyncio.gather(*(_request(asgi_app, "/") for _ in range(4)))
+        return time.monotonic() - started
+
+    # One shared thread (plain WsgiToAsgi) would take 1.2s
+    assert asyncio.run(four_requests()) < 0.9
@@ -0,0 +1,28 @@
+import time
+
+from werkzeug.security import generate_password_hash
+
+import db
+from auth import services
+from auth.repository import UserRepository
+
+
+def test_successful_login_queues_last_login_on_group_commit_writer(app):
+    with app.app_context():
+        user_id = UserRepository.create(
+            "writer-batches@x.org", generate_password_hash("Correct-Horse-1")
+        )
+        UserRepository.activate(user_id)
+        UserRepository.increment_failed_logins(user_id)
+
+    before = db.writer_stats()["ops"]
+    with app.test_request_context():
+        result = services.login_user("writer-batches@x.org", "Correct-Horse-1")
+        assert result.ok
+        assert "db" not in db.g
+
+    # reset_failed_logins is awaited, update_last_login is not
+    deadline = time.monotonic() + 2
+    while db.writer_stats()["ops"] < before + 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db.writer_stats()["ops"] == before + 2
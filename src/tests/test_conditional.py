@@ -0,0 +1,68 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.http import http_date
+from werkzeug.security import generate_password_hash
+
+from auth.repository import UserRepository
+from content.conditional import PageValidators
+from content.repository import PostRepository
+
+
+def _stamp(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def test_write_in_the_same_second_is_not_answered_with_304(app):
+    now = datetime.now(timezone.utc)
+    if now.microsecond > 900_000:
+        time.sleep(0.1)
+        now = datetime.now(timezone.utc)
+    # The cached copy and the write that followed it share this second
+    since = {"If-Modified-Since": http_date(now)}
+    with app.test_request_context(headers=since):
+        validators = PageValidators((2, _stamp(now)), "feed", 1, None)
+        assert not validators.not_modified()
+        assert validators.apply("page").last_modified is None
+
+
+def test_if_modified_since_is_honoured_for_earlier_seconds(app):
+    earlier = datetime.now(timezone.utc) - timedelta(minutes=1)
+    since = {"If-Modified-Since": http_date(earlier)}
+    with app.test_request_context(headers=since):
+        validators = PageValidators((2, _stamp(earlier)), "feed", 1, None)
+        assert validators.not_modified()
+        assert validators.apply("page").last_modified is not None
+
+
+def _csrf_token(page):
+    match = re.search(rb'name="csrf_token" value="([^"]+)"', page)
+    return match.group(1)
+
+
+def _login(client, email, password):
+    response = client.post("/login", data={"email": email, "password": password})
+    assert response.status_code == 302
+
+
+def test_new_session_does_not_revalidate_the_old_sessions_page(app, client):
+    with app.app_context():
+        user_id = UserRepository.create(
+            "etag-session@x.org", generate_password_hash("Correct-Horse-1")
+        )
+        UserRepository.activate(user_id)
+        post_id = PostRepository.create(user_id, "ETag post", "Body", True)
+
+    _login(client, "etag-session@x.org", "Correct-Horse-1")
+    first = client.get(f"/content/post/{post_id}")
+    assert first.status_code == 200
+
+    client.get("/logout")
+    _login(client, "etag-session@x.org", "Correct-Horse-1")
+    again = client.get(
+        f"/content/post/{post_id}", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert again.status_code == 200
+    assert _csrf_token(again.data) != _csrf_token(first.data)
@@ -0,0 +1,41 @@
+import functools
+import sqlite3
+
+import blobs
+import init_db
+import migrations
+
+
+def test_legacy_uploads_are_folded_after_the_migration_commits(
+    tmp_path, upload_root, monkeypatch
+):
+    path = str(tmp_path / "v8.db")
+    migrate = migrations.migrate
+    monkeypatch.setattr(init_db, "DB_FILE", path)
+    monkeypatch.setattr(migrations, "migrate", functools.partial(migrate, target=8))
+    init_db.init_db()
+    monkeypatch.setattr(migrations, "migrate", migrate)
+
+    legacy = upload_root / "7" / "old-name.txt"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"legacy content")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO attachments (post_id, uploader_id, original_name, stored_name,"
+        " mime_type, size_bytes, created_at)"
+        " VALUES (7, 1, 'a.txt', 'old-name.txt', 'text/plain', 14, '2025-01-01')"
+    )
+    conn.commit()
+
+    assert migrations.migrate(conn) == [9]
+    # The schema change alone: files are only touched after the commit
+    assert legacy.exists()
+    assert conn.execute("SELECT sha256 FROM attachments").fetchone()[0] is None
+
+    migrations.after_migrations(conn)
+    migrations.after_migrations(conn)
+    digest = conn.execute("SELECT sha256 FROM attachments").fetchone()[0]
+    conn.close()
+    assert not legacy.exists()
+    with open(blobs.blob_path(digest), "rb") as f:
+        assert f.read() == b"legacy content"
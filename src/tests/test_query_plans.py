@@ -0,0 +1,297 @@
+"""
+EXPLAIN QUERY PLAN regression check for every repository query.
+
+Seeds the test database with a realistic amount of data, calls every
+repository method while tracing the SQL it runs, and asks SQLite for the
+plan of each statement. A method fails when one of its statements falls
+back to a full table scan or sorts through a temporary B-tree, and the
+coverage test fails when a repository method has no entry in CALLS below.
+Run with -v to list every checked method.
+"""
+
+import inspect
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+
+import db
+import init_db
+from auth.repository import TokenRepository, UserRepository
+from content.repository import (
+    AttachmentRepository,
+    CommentRepository,
+    ContentVersionRepository,
+    FeedRepository,
+    PostRepository,
+    _feed_insert,
+)
+from user.repository import UserProfileRepository
+
+N_USERS = 2000
+N_POSTS = 20000
+N_COMMENTS = 60000
+N_ATTACHMENTS = 8000
+
+REPOSITORIES = [
+    UserRepository,
+    TokenRepository,
+    PostRepository,
+    FeedRepository,
+    CommentRepository,
+    AttachmentRepository,
+    ContentVersionRepository,
+    UserProfileRepository,
+]
+
+# (created_at, id) of a seeded post, for the keyset pagination variants
+KEYSET_POSITION = ("2025-01-08T00:00:00", 8000)
+
+# One representative call per repository method. Ids refer to seeded rows.
+CALLS = {
+    "UserRepository.create": lambda: UserRepository.create("plan@x.org", "h"),
+    "UserRepository.create_many": lambda: UserRepository.create_many(
+        [("plan1@x.org", "h"), ("plan2@x.org", "h")]
+    ),
+    "UserRepository.get_by_email": lambda: UserRepository.get_by_email("user42@x.org"),
+    "UserRepository.get_by_id": lambda: UserRepository.get_by_id(42),
+    "UserRepository.activate": lambda: UserRepository.activate(42),
+    "UserRepository.increment_failed_logins": lambda: UserRepository.increment_failed_logins(42),
+    "UserRepository.reset_failed_logins": lambda: UserRepository.reset_failed_logins(42),
+    "UserRepository.update_last_login": lambda: UserRepository.update_last_login(42),
+    "UserRepository.get_mfa_state": lambda: UserRepository.get_mfa_state(42),
+    "UserRepository.enable_mfa": lambda: UserRepository.enable_mfa(42, "S", "[]"),
+    "UserRepository.update_backup_codes": lambda: UserRepository.update_backup_codes(42, "[]"),
+    "UserRepository.update_password": lambda: UserRepository.update_password(42, "h"),
+    "TokenRepository.create": lambda: TokenRepository.create(
+        "plan-token", 42, datetime.now(), "activation"
+    ),
+    "TokenRepository.get_by_token": lambda: TokenRepository.get_by_token("token42", "activation"),
+    "TokenRepository.mark_used": lambda: TokenRepository.mark_used("token42"),
+    "TokenRepository.invalidate_all_of_type_for_user": lambda: (
+        TokenRepository.invalidate_all_of_type_for_user(42, "password_reset")
+    ),
+    "PostRepository.create": lambda: PostRepository.create(42, "t", "b", True),
+    "PostRepository.create_many": lambda: PostRepository.create_many(
+        [(42, "t", "b", True), (43, "t", "b", False)]
+    ),
+    "PostRepository.get_by_id": lambda: PostRepository.get_by_id(4242),
+    "PostRepository.get_detail": lambda: PostRepository.get_detail(4242),
+    "PostRepository.get_public_posts": lambda: (
+        PostRepository.get_public_posts(limit=10, offset=0),
+        PostRepository.get_public_posts(limit=10, after=KEYSET_POSITION),
+        PostRepository.get_public_posts(limit=10, before=KEYSET_POSITION),
+    ),
+    "PostRepository.get_all_posts": lambda: (
+        PostRepository.get_all_posts(limit=20, offset=0),
+        PostRepository.get_all_posts(limit=20, after=KEYSET_POSITION),
+        PostRepository.get_all_posts(limit=20, before=KEYSET_POSITION),
+    ),
+    "PostRepository.get_by_author": lambda: (
+        PostRepository.get_by_author(42, limit=10, offset=0),
+        PostRepository.get_by_author(42, limit=10, after=KEYSET_POSITION),
+        PostRepository.get_by_author(42, limit=10, before=KEYSET_POSITION),
+    ),
+    "PostRepository.with_card_stats": lambda: PostRepository.with_card_stats(
+        PostRepository.get_all_posts(limit=20)
+    ),
+    "PostRepository.update": lambda: PostRepository.update(4242, "t", "b", True),
+    "PostRepository.delete": lambda: PostRepository.delete(4243),
+    "PostRepository.search": lambda: (
+        PostRepository.search("lorem dolor"),
+        PostRepository.search("file42", offset=20),
+    ),
+    "FeedRepository.refresh_posts": lambda: FeedRepository.refresh_posts([4242, 4243]),
+    "FeedRepository.remove_post": lambda: FeedRepository.remove_post(4244),
+    "FeedRepository.refresh_author": lambda: FeedRepository.refresh_author(42),
+    "FeedRepository.remove_author": lambda: FeedRepository.remove_author(47),
+    "FeedRepository.rebuild": lambda: FeedRepository.rebuild(),
+    "CommentRepository.create": lambda: CommentRepository.create(42, 4242, "c"),
+    "CommentRepository.create_many": lambda: CommentRepository.create_many(
+        [(42, 4242, "c"), (43, 4242, "d")]
+    ),
+    "CommentRepository.get_by_post": lambda: (
+        CommentRepository.get_by_post(4242),
+        CommentRepository.get_by_post(4242, after=("2025-01-30T00:00:00", 30000)),
+    ),
+    "CommentRepository.count_by_posts": lambda: CommentRepository.count_by_posts(
+        list(range(4200, 4220))
+    ),
+    "CommentRepository.delete": lambda: CommentRepository.delete(4242),
+    "AttachmentRepository.create": lambda: AttachmentRepository.create(
+        4242, 42, "a.png", "ab" * 32, "image/png", 10, "ab" * 32
+    ),
+    "AttachmentRepository.create_many": lambda: AttachmentRepository.create_many(
+        [(4242, 42, "a.png", "cd" * 32, "image/png", 10, "cd" * 32)]
+    ),
+    "AttachmentRepository.get_by_post": lambda: AttachmentRepository.get_by_post(4242),
+    "AttachmentRepository.summarize_by_posts": lambda: (
+        AttachmentRepository.summarize_by_posts(list(range(4200, 4220)))
+    ),
+    "AttachmentRepository.get_by_id": lambda: AttachmentRepository.get_by_id(42),
+    "AttachmentRepository.delete": lambda: AttachmentRepository.delete(43),
+    "AttachmentRepository.referenced_digests": lambda: (
+        AttachmentRepository.referenced_digests([f"{i:064x}" for i in range(40, 60)])
+    ),
+    "ContentVersionRepository.get": lambda: ContentVersionRepository.get(),
+    "UserProfileRepository.get_user_by_id": lambda: UserProfileRepository.get_user_by_id(42),
+    "UserProfileRepository.get_user_by_email": lambda: (
+        UserProfileRepository.get_user_by_email("user42@x.org")
+    ),
+    "UserProfileRepository.update_email": lambda: (
+        UserProfileRepository.update_email(44, "renamed44@x.org")
+    ),
+    "UserProfileRepository.set_disabled": lambda: UserProfileRepository.set_disabled(45, True),
+    "UserProfileRepository.delete_user": lambda: UserProfileRepository.delete_user(46),
+    "UserProfileRepository.list_users": lambda: UserProfileRepository.list_users(limit=50),
+}
+
+# Plans that are known to scan, with the reason they are tolerated.
+# Keyed by (method, table or alias named in the plan detail).
+KNOWN_SCANS = {
+    ("FeedRepository.rebuild", "u"): "rebuild recomputes the whole feed by design",
+}
+
+# Statements that have no plan worth checking ("--" marks trigger programs)
+SKIPPED_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "--")
+
+
+def seed(conn):
+    """Fill the schema with a realistic spread of users, posts and comments."""
+    rnd = random.Random(42)
+    start = datetime(2025, 1, 1)
+
+    def ts(i):
+        return (start + timedelta(minutes=i)).isoformat()
+
+    conn.executemany(
+        """
+        INSERT INTO users (email, password_hash, created_at, activated, disabled, disabled_by_admin)
+        VALUES (?, 'h', ?, 1, ?, 0)
+        """,
+        [(f"user{i}@x.org", ts(i), int(rnd.random() < 0.02)) for i in range(1, N_USERS + 1)],
+    )
+    conn.executemany(
+        """
+        INSERT INTO tokens (token, user_id, expires_at, created_at, type)
+        VALUES (?, ?, ?, ?, 'activation')
+        """,
+        [(f"token{i}", i, ts(i + 1440), ts(i)) for i in range(1, N_USERS + 1)],
+    )
+    conn.executemany(
+        """
+        INSERT INTO posts (author_id, title, body, excerpt, is_public, created_at, updated_at)
+        VALUES (?, ?, ?, substr(?3, 1, 300), ?, ?, ?)
+        """,
+        [
+            (
+                rnd.randint(1, N_USERS),
+                f"Post {i}",
+                "lorem ipsum dolor sit amet " * rnd.randint(5, 200),
+                int(rnd.random() < 0.8),
+                ts(N_USERS + i),
+                ts(N_USERS + i),
+            )
+            for i in range(1, N_POSTS + 1)
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO comments (author_id, post_id, text, created_at) VALUES (?, ?, ?, ?)",
+        [
+            (rnd.randint(1, N_USERS), rnd.randint(1, N_POSTS), "nice", ts(N_USERS + N_POSTS + i))
+            for i in range(1, N_COMMENTS + 1)
+        ],
+    )
+    conn.executemany(
+        """
+        INSERT INTO attachments (post_id, uploader_id, original_name, stored_name, mime_type, size_bytes, sha256, created_at)
+        VALUES (?, ?, ?, ?4, 'image/png', 1000, ?4, ?5)
+        """,
+        [
+            # Some content is uploaded more than once
+            (rnd.randint(1, N_POSTS), rnd.randint(1, N_USERS), f"file{i}.png", f"{i % 6000:064x}", ts(i))
+            for i in range(1, N_ATTACHMENTS + 1)
+        ],
+    )
+    conn.execute(_feed_insert("1 = 1"))
+    conn.commit()
+    # Give the planner real statistics, as a long-running database would have
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def repository_methods():
+    for repo in REPOSITORIES:
+        for name, attr in inspect.getmembers(repo):
+            if not name.startswith("_") and callable(attr):
+                yield f"{repo.__name__}.{name}"
+
+
+def plan_problems(method, plan_rows):
+    """Return a description for every plan row that scans or sorts."""
+    problems = []
+    for row in plan_rows:
+        detail = row[3]
+        if (
+            detail.startswith("SCAN ")
+            and " USING " not in detail
+            and detail != "SCAN CONSTANT ROW"
+            # FTS5 answering a MATCH constraint from its full-text index
+            and not (" VIRTUAL TABLE INDEX " in detail and ":M" in detail)
+        ):
+            table = detail.split()[1]
+            if (method, table) not in KNOWN_SCANS:
+                problems.append(f"full table scan: {detail}")
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(f"temp b-tree: {detail}")
+    return problems
+
+
+def trace_call(app, call):
+    statements = []
+    with app.app_context():
+        # Hold both connections up front so queued writes run inline and are traced
+        for conn in (db.get_read_db(), db.get_write_db()):
+            conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            for conn in (g.get("read_db"), g.get("db")):
+                if conn is not None:
+                    conn.set_trace_callback(None)
+    return [
+        s
+        for s in statements
+        if not s.lstrip().upper().startswith(SKIPPED_PREFIXES)
+        # SQL the FTS5 module runs against its own shadow tables
+        and "'main'." not in s
+    ]
+
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    """The test database, rebuilt and seeded; rebuilt empty again afterwards."""
+    init_db.init_db()
+    conn = sqlite3.connect(db.DATABASE)
+    seed(conn)
+    yield conn
+    conn.close()
+    init_db.init_db()
+
+
+def test_every_repository_method_is_checked():
+    assert sorted(set(repository_methods()) - set(CALLS)) == []
+
+
+@pytest.mark.parametrize("method", list(CALLS))
+def test_query_plan(app, seeded, method):
+    problems = []
+    for sql in trace_call(app, CALLS[method]):
+        plan = seeded.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        problems += [
+            f"{problem}\n    {' '.join(sql.split())}"
+            for problem in plan_problems(method, plan)
+        ]
+    assert not problems, "\n".join(problems)
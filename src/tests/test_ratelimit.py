@@ -0,0 +1,16 @@
+import ratelimit
+
+
+def test_rejected_post_does_not_use_up_the_posting_limit(client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    ratelimit.get_store().clear()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["role"] = "user"
+
+    invalid = client.post("/content/post/create", data={"title": "x" * 300, "body": "body"})
+    assert invalid.status_code == 200
+
+    valid = {"title": "Rate limited post", "body": "A body long enough to be valid."}
+    assert client.post("/content/post/create", data=valid).status_code == 302
+    assert client.post("/content/post/create", data=valid).status_code == 429
@@ -0,0 +1,18 @@
+from content import services
+
+
+def test_layout_is_sent_before_deferred_rows_load(client, monkeypatch):
+    events = []
+    get_public_feed = services.get_public_feed
+
+    def recording_feed(*args, **kwargs):
+        events.append("load")
+        return get_public_feed(*args, **kwargs)
+
+    monkeypatch.setattr(services, "get_public_feed", recording_feed)
+    response = client.get("/content/feed", buffered=False)
+    for chunk in response.response:
+        events.append("chunk")
+
+    assert "load" in events
+    assert events.index("chunk") < events.index("load")
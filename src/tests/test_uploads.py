@@ -0,0 +1,15 @@
+import os
+import stat
+
+import blobs
+from content.uploads import STORED_FILE_MODE, UploadSpool
+
+
+def test_stored_blob_is_readable_by_nginx(tmp_path, upload_root):
+    spool = UploadSpool(directory=str(tmp_path / "spool"))
+    spool.write(b"attachment content")
+    spool.persist(blobs.blob_target(spool.sha256))
+    spool.close()
+
+    mode = stat.S_IMODE(os.stat(blobs.blob_path(spool.sha256)).st_mode)
+    assert mode == STORED_FILE_MODE == 0o644
@@ -0,0 +1,23 @@
+import logging
+import sqlite3
+
+import pytest
+
+from db import ConnectionPool
+from write_queue import GroupCommitWriter
+
+
+def test_failed_fire_and_forget_write_is_logged(tmp_path, caplog):
+    pool = ConnectionPool(str(tmp_path / "queue.db"), max_size=1)
+    writer = GroupCommitWriter(pool, max_delay=0)
+    ok = writer.submit("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    ok.result(timeout=5)
+
+    with caplog.at_level(logging.ERROR, logger="write_queue"):
+        failed = writer.submit("INSERT INTO missing VALUES (1)")
+        with pytest.raises(sqlite3.OperationalError):
+            failed.result(timeout=5)
+    writer.stop()
+
+    assert "INSERT INTO missing" in caplog.text
+    assert writer.stats()["failed"] == 1
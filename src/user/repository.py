@@ -2,13 +2,16 @@
 Repository pattern for user profile data access.
 """
 
-from db import get_db
+from content.repository import FeedRepository
+from db import get_db, identity_mapped, reads, transaction, writes
 
 
 class UserProfileRepository:
     """Handles user profile-related database operations."""
 
     @staticmethod
+    @identity_mapped
+    @reads
     def get_user_by_id(user_id):
         """Get user by ID. Returns user row or None."""
         db = get_db()
@@ -23,6 +26,7 @@ class UserProfileRepository:
         ).fetchone()
 
     @staticmethod
+    @reads
     def get_user_by_email(email):
         """Get user by email. Returns user row or None."""
         db = get_db()
@@ -32,51 +36,68 @@ class UserProfileRepository:
         ).fetchone()
 
     @staticmethod
+    @writes
     def update_email(user_id, new_email):
         """Update user email address."""
-        db = get_db()
-        db.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
-        db.commit()
+        with transaction() as db:
+            db.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+            FeedRepository.refresh_author(user_id)
 
     @staticmethod
+    @writes
     def set_disabled(user_id, disabled, disabled_by_admin=False):
         """Enable or disable a user account."""
-        db = get_db()
-        db.execute(
-            """
-            UPDATE users
-            SET disabled = ?, disabled_by_admin = ?
-            WHERE id = ?
-            """,
-            (1 if disabled else 0, 1 if disabled_by_admin else 0, user_id),
-        )
-        db.commit()
+        with transaction() as db:
+            db.execute(
+                """
+                UPDATE users
+                SET disabled = ?, disabled_by_admin = ?
+                WHERE id = ?
+                """,
+                (1 if disabled else 0, 1 if disabled_by_admin else 0, user_id),
+            )
+            FeedRepository.refresh_author(user_id)
 
     @staticmethod
+    @writes
     def delete_user(user_id):
         """
         Delete user account and all associated data.
-        This includes posts, comments, and tokens.
+        This includes posts, their attachments, comments, and tokens.
+        Returns the attachment digests released, for the caller to reclaim.
         """
-        db = get_db()
-
-        # Delete user's comments first (foreign key constraint)
-        db.execute("DELETE FROM comments WHERE author_id = ?", (user_id,))
+        with transaction() as db:
+            # Delete user's comments first (foreign key constraint)
+            db.execute("DELETE FROM comments WHERE author_id = ?", (user_id,))
 
-        # Delete user's posts
-        db.execute("DELETE FROM posts WHERE author_id = ?", (user_id,))
+            # Attachments of the user's posts; their files may become unreferenced
+            rows = db.execute(
+                """
+                DELETE FROM attachments
+                WHERE post_id IN (SELECT id FROM posts WHERE author_id = ?)
+                RETURNING sha256
+                """,
+                (user_id,),
+            ).fetchall()
 
-        # Delete user's tokens
-        db.execute("DELETE FROM tokens WHERE user_id = ?", (user_id,))
+            # Delete user's posts and their feed entries
+            db.execute("DELETE FROM posts WHERE author_id = ?", (user_id,))
+            FeedRepository.remove_author(user_id)
 
-        # Finally, delete the user
-        db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            # Delete user's tokens
+            db.execute("DELETE FROM tokens WHERE user_id = ?", (user_id,))
 
-        db.commit()
+            # Finally, delete the user
+            db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        return {row[0] for row in rows if row[0]}
 
     @staticmethod
+    @reads
     def list_users(limit=50, offset=0):
-        """Return basic info for users for admin listing."""
+        """
+        Return basic info for users for admin listing, as a cursor: rows are
+        fetched as the caller iterates, not loaded up front.
+        """
         db = get_db()
         return db.execute(
             """
@@ -86,4 +107,4 @@ class UserProfileRepository:
             LIMIT ? OFFSET ?
             """,
             (limit, offset),
-        ).fetchall()
+        )
@@ -9,6 +9,7 @@ from flask import (
     session,
 )
 from session_helpers import login_required, admin_required
+from templating import Deferred, stream_page
 
 from . import services
 
@@ -24,9 +25,17 @@ def profile():
 
     # Get user's recent posts
     page = request.args.get("page", 1, type=int)
-    posts = services.get_user_feed(user_id, page=page)
+    cursor = request.args.get("cursor")
+    feed = services.get_user_feed(user_id, page=page, cursor=cursor)
 
-    return render_template("profile.html", user=user_data, posts=posts, page=page)
+    return render_template(
+        "profile.html",
+        user=user_data,
+        posts=feed.posts,
+        page=page,
+        next_cursor=feed.next_cursor,
+        prev_cursor=feed.prev_cursor,
+    )
 
 
 @user_bp.route("/profile/<int:target_user_id>")
@@ -38,13 +47,16 @@ def admin_view_profile(target_user_id):
         return render_template("404.html"), 404
 
     page = request.args.get("page", 1, type=int)
-    posts = services.get_user_feed(target_user_id, page=page)
+    cursor = request.args.get("cursor")
+    feed = services.get_user_feed(target_user_id, page=page, cursor=cursor)
 
     return render_template(
         "profile.html",
         user=user_data,
-        posts=posts,
+        posts=feed.posts,
         page=page,
+        next_cursor=feed.next_cursor,
+        prev_cursor=feed.prev_cursor,
         admin_view=True,
     )
 
@@ -55,10 +67,8 @@ def admin_list_users():
     """Admin list of users with links to manage."""
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 50, type=int)
-    users = services.get_all_users(page=page, per_page=per_page)
-    return render_template(
-        "admin_users.html", users=users, page=page, per_page=per_page
-    )
+    users = Deferred(lambda: services.get_all_users(page=page, per_page=per_page))
+    return stream_page("admin_users.html", users=users, page=page, per_page=per_page)
 
 
 @user_bp.route("/settings")
@@ -172,7 +182,7 @@ def admin_disable_user(target_user_id):
         return render_template(
             "profile.html",
             user=user_data,
-            posts=services.get_user_feed(target_user_id),
+            posts=services.get_user_feed(target_user_id).posts,
             admin_view=True,
             admin_errors=["You cannot disable your own admin account."],
         )
@@ -189,7 +199,7 @@ def admin_disable_user(target_user_id):
     return render_template(
         "profile.html",
         user=user_data,
-        posts=services.get_user_feed(target_user_id),
+        posts=services.get_user_feed(target_user_id).posts,
         admin_view=True,
         admin_success="User account disabled." if result.ok else None,
         admin_errors=None if result.ok else result.errors,
@@ -212,7 +222,7 @@ def admin_enable_user(target_user_id):
     return render_template(
         "profile.html",
         user=user_data,
-        posts=services.get_user_feed(target_user_id),
+        posts=services.get_user_feed(target_user_id).posts,
         admin_view=True,
         admin_success="User account enabled." if result.ok else None,
         admin_errors=None if result.ok else result.errors,
@@ -11,6 +11,7 @@ from .validators import (
     validate_account_disable,
 )
 from .repository import UserProfileRepository
+from content.services import release_blobs
 
 
 class UpdateEmailResult:
@@ -51,15 +52,17 @@ def get_user_profile(user_id):
     }
 
 
-def get_user_feed(user_id, page=1, per_page=10):
+def get_user_feed(user_id, page=1, per_page=10, cursor=None):
     """
     Get user's personal feed (their own posts).
-    Returns list of posts.
+    Returns a content PostPage (posts plus next/previous cursors).
     """
     # Import here to avoid circular dependency
     from content import services as content_services
 
-    return content_services.get_user_posts(user_id, page=page, per_page=per_page)
+    return content_services.get_user_posts(
+        user_id, page=page, per_page=per_page, cursor=cursor
+    )
 
 
 def get_all_users(page=1, per_page=50):
@@ -134,7 +137,7 @@ def delete_user_account(user_id, password, confirmation):
 
     # Delete user account
     try:
-        UserProfileRepository.delete_user(user_id)
+        release_blobs(UserProfileRepository.delete_user(user_id))
         return DeleteAccountResult(ok=True)
     except Exception as e:
         return DeleteAccountResult(
@@ -0,0 +1,156 @@
+"""
+Single-writer queue with group commit.
+A dedicated thread takes write operations from a queue and commits them in
+small batches, so a burst of hot-path writes (failed login counters, last
+login stamps, comments) shares one fsync instead of paying one each.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# A batch is committed once it holds MAX_OPS operations or MAX_DELAY has elapsed
+MAX_OPS = int(os.environ.get("DB_GROUP_COMMIT_MAX_OPS") or 32)
+MAX_DELAY = float(os.environ.get("DB_GROUP_COMMIT_DELAY_MS") or 2) / 1000
+
+
+class _WriteOp:
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.future = Future()
+
+
+class GroupCommitWriter:
+    """
+    Owns the write path for queued operations. Each batch checks the writer
+    connection out of the write pool, runs every operation inside its own
+    savepoint (so one failing statement does not sink the others), commits
+    once and only then resolves the callers' futures.
+    """
+
+    def __init__(self, pool, max_ops=MAX_OPS, max_delay=MAX_DELAY):
+        self.pool = pool
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._ops = 0
+        self._failed = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Flush pending operations and stop the writer thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, sql, params=()):
+        """
+        Queue a write. Returns a Future resolving to the cursor's lastrowid
+        once the batch containing it has been committed.
+        """
+        op = _WriteOp(sql, params)
+        self.start()
+        self._queue.put(op)
+        return op.future
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "ops": self._ops,
+                "failed": self._failed,
+                "avg_batch": self._ops / self._batches if self._batches else 0.0,
+                "pending": self._queue.qsize(),
+            }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_ops:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._commit_batch(self._collect(first))
+
+    def _commit_batch(self, batch):
+        results = []
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            logger.exception("No writer connection for %d queued operations", len(batch))
+            for op in batch:
+                op.future.set_exception(e)
+            return
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for i, op in enumerate(batch):
+                conn.execute(f"SAVEPOINT op{i}")
+                try:
+                    cur = conn.execute(op.sql, op.params)
+                    results.append((op, cur.lastrowid, None))
+                except sqlite3.Error as e:
+                    conn.execute(f"ROLLBACK TO op{i}")
+                    results.append((op, None, e))
+                conn.execute(f"RELEASE op{i}")
+            conn.commit()
+        except Exception as e:
+            logger.exception("Group commit of %d operations failed", len(batch))
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            for op in batch:
+                if not op.future.done():
+                    op.future.set_exception(e)
+            with self._lock:
+                self._failed += len(batch)
+            return
+        finally:
+            self.pool.release(conn)
+
+        failed = 0
+        for op, rowid, error in results:
+            if error is not None:
+                failed += 1
+                # Fire-and-forget callers never read the future: log it here
+                logger.error("Queued write failed: %s", op.sql, exc_info=error)
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(rowid)
+        with self._lock:
+            self._batches += 1
+            self._ops += len(batch)
+            self._failed += failed